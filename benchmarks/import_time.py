@@ -0,0 +1,93 @@
+"""
+Measures the time needed to import the LectureDoc2 writer (using Python's
+`-X importtime`) and checks that the modules which are only needed by some
+documents (pycryptodome, the lddirectives modules, ...) are not imported
+eagerly.
+
+    python3 benchmarks/import_time.py [--runs N] [--top N] [--max-ms MS]
+
+The exit status is 1 if a lazily loaded module was imported or if the
+(median) import time exceeds the given maximum.
+"""
+
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Modules which must only be imported on first use.
+ldLazyModules = [
+    "Crypto",
+    "sqlite3",
+    "concurrent.futures.process",
+    "lddocutils.ldwriter.encryption_cache",
+    "lddocutils.ldwriter.assets",
+    "lddocutils.ldwriter.images",
+    "lddocutils.ldwriter.search_index",
+    "lddocutils.ldwriter.lddirectives.",
+]
+
+IMPORT_TIME = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)")
+
+
+def measure(module):
+    """Returns the imported modules and their (self, cumulative) times in µs."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    imports = {}
+    for match in IMPORT_TIME.finditer(result.stderr):
+        imports[match[4]] = (int(match[1]), int(match[2]))
+    return imports
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument("--module", default="lddocutils.ldwriter")
+    parser.add_argument("--runs", type=int, default=10, metavar="N")
+    parser.add_argument(
+        "--top", type=int, default=15, metavar="N", help="show the N slowest modules"
+    )
+    parser.add_argument(
+        "--max-ms", type=float, metavar="MS", help="the maximum (median) import time"
+    )
+    args = parser.parse_args(argv)
+
+    runs = [measure(args.module) for _ in range(args.runs)]
+    totals = [imports[args.module][1] / 1000 for imports in runs]
+    median = statistics.median(totals)
+    print(
+        f"import {args.module}: median {median:.1f} ms, "
+        f"min {min(totals):.1f} ms, max {max(totals):.1f} ms ({args.runs} runs)"
+    )
+
+    last = runs[-1]
+    print("\nSlowest modules (self time of the last run):")
+    for name, (own, _) in sorted(last.items(), key=lambda i: -i[1][0])[: args.top]:
+        print(f"{own / 1000:8.1f} ms  {name}")
+
+    status = 0
+    eager = [
+        name
+        for name in last
+        if any(name.startswith(lazy) for lazy in ldLazyModules)
+    ]
+    if eager:
+        status = 1
+        print("\nModules which should be imported lazily:", ", ".join(eager))
+    if args.max_ms is not None and median > args.max_ms:
+        status = 1
+        print(f"\nThe import time exceeds {args.max_ms} ms.")
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,176 @@
+"""
+Converts multiple documents in one invocation using a pool of worker
+processes; each worker imports docutils and the LectureDoc2 writer (and
+registers the directives) only once.
+
+    rst2ld.py --batch [--jobs N] <files or directories> [-- <docutils options>]
+
+Directories are searched (recursively) for ".rst" files. The output of
+"<name>.rst" is written to "<name>.rst.html". The docutils options (e.g.,
+"--ld-path") are used for all documents.
+
+If a manifest is specified (`--manifest <file>`), documents whose inputs
+did not change since the last conversion are skipped (see
+`lddocutils.manifest`).
+
+If a doctree cache is specified (`--doctree-cache <directory>`), the parsed
+documents are cached; when only writer settings changed, the documents are
+not parsed again (see `lddocutils.doctree_cache`).
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import textwrap
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+
+from lddocutils.doctree_cache import DoctreeCache
+from lddocutils.manifest import Manifest, settings_fingerprint
+from lddocutils.publishing import new_publisher, split_args
+
+
+def find_sources(paths):
+    for path in paths:
+        if os.path.isdir(path):
+            for dirpath, dirnames, filenames in os.walk(path):
+                dirnames[:] = sorted(d for d in dirnames if not d.startswith("."))
+                for filename in sorted(filenames):
+                    if filename.endswith(".rst"):
+                        yield os.path.join(dirpath, filename)
+        else:
+            yield path
+
+
+def publish(source, destination, docutils_args):
+    """Converts the document as `publish_cmdline` does, but returns the
+    publisher to make the document (and the settings) accessible."""
+    publisher = new_publisher()
+    publisher.publish(
+        argv=[*docutils_args, source, destination], enable_exit_status=True
+    )
+    return publisher
+
+
+def convert(source, destination, docutils_args, doctree_cache=None):
+    """Converts a single document; `doctree_cache` is the directory of the
+    doctree cache (optional).
+
+    Returns the exit status, all messages (warnings, errors) which were
+    reported while converting the document, the files (e.g., included
+    files) the conversion depended on and the files it wrote in addition
+    to the output file (e.g., the passwords file).
+    """
+    messages = io.StringIO()
+    status = 0
+    dependencies = []
+    outputs = []
+    with contextlib.redirect_stderr(messages):
+        try:
+            if doctree_cache is None:
+                publisher = publish(source, destination, docutils_args)
+            else:
+                publisher = DoctreeCache(doctree_cache).publish(
+                    source, destination, docutils_args
+                )
+            dependencies = publisher.settings.record_dependencies.list
+            outputs = publisher.writer.parts.get("outputs", [])
+        except SystemExit as exit:
+            status = exit.code if isinstance(exit.code, int) else 1
+        except Exception:
+            traceback.print_exc()
+            status = 1
+    return (status, messages.getvalue(), dependencies, outputs)
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(
+        prog="rst2ld.py --batch",
+        description="Converts multiple reStructuredText documents to LectureDoc2.",
+    )
+    parser.add_argument(
+        "paths", nargs="+", metavar="PATH", help="the documents or directories"
+    )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=os.cpu_count(),
+        metavar="N",
+        help="the number of worker processes (default: number of cores)",
+    )
+    parser.add_argument(
+        "--suffix",
+        default=".html",
+        help='the suffix appended to the name of the output file (default: ".html")',
+    )
+    parser.add_argument(
+        "--manifest",
+        metavar="FILE",
+        help="the build manifest used to skip unchanged documents",
+    )
+    parser.add_argument(
+        "--doctree-cache",
+        metavar="DIR",
+        help="the directory of the cache of the parsed documents",
+    )
+    (argv, docutils_args) = split_args(argv)
+    args = parser.parse_args(argv)
+
+    sources = list(find_sources(args.paths))
+    manifest = None
+    if args.manifest is not None:
+        manifest = Manifest(args.manifest)
+        fingerprint = settings_fingerprint(docutils_args)
+        up_to_date = [
+            source
+            for source in sources
+            if manifest.is_up_to_date(source, source + args.suffix, fingerprint)
+        ]
+        for source in up_to_date:
+            print(f"[UP-TO-DATE] {source}")
+        sources = [source for source in sources if source not in up_to_date]
+
+    destinations = [source + args.suffix for source in sources]
+    if args.jobs > 1 and len(sources) > 1:
+        with ProcessPoolExecutor(min(args.jobs, len(sources))) as executor:
+            results = list(
+                executor.map(
+                    convert,
+                    sources,
+                    destinations,
+                    [docutils_args] * len(sources),
+                    [args.doctree_cache] * len(sources),
+                )
+            )
+    else:
+        results = [
+            convert(source, destination, docutils_args, args.doctree_cache)
+            for source, destination in zip(sources, destinations)
+        ]
+
+    if manifest is not None:
+        for source, destination, (status, _, dependencies, outputs) in zip(
+            sources, destinations, results
+        ):
+            if status == 0:
+                manifest.record(
+                    source, destination, dependencies, fingerprint, outputs
+                )
+        manifest.save()
+    return report(sources, results)
+
+
+def report(sources, results):
+    """Reports the result of each conversion; returns the exit status."""
+    failed = 0
+    for source, (status, messages, *_) in zip(sources, results):
+        if status == 0:
+            print(f"[OK]     {source}")
+        else:
+            failed += 1
+            print(f"[FAILED] {source} (exit status: {status})")
+        if messages:
+            print(textwrap.indent(messages, " " * 9), end="")
+    print(f"{len(sources) - failed} of {len(sources)} documents converted.")
+    return 1 if failed else 0
@@ -0,0 +1,326 @@
+"""
+Cache of parsed (and transformed) doctrees.
+
+Parsing a document - including the directives and the reader's and
+parser's transforms - is a major part of a conversion. The cache stores
+the doctree after these steps; the key is the hash of the source, of all
+included files and of all settings which are not writer settings. Hence,
+when only writer settings (e.g., `--ld-path`, `--theme` or `--modules`)
+change, only the writer's transforms and the translator are run.
+
+If the document changed, only the slides whose text changed are parsed
+again (see `lddocutils.sections`); the parsed slides are cached, too. If
+no encryption cache is configured (`--ld-cache-dir`), the encrypted blocks
+are cached in the same directory; i.e., the solutions and presenter notes
+of unchanged slides are not encrypted again.
+
+The messages reported while a document is parsed are cached with its
+doctree; they are reported again - and taken into account by the exit
+status (`--exit-status`) - when the cached doctree is used.
+
+The cache directory contains, per source, an index file which stores the
+dependencies and the key of the cached doctree, an index of the cached
+slides, the pickled doctree and the pickled slides.
+"""
+
+import collections
+import contextlib
+import copy
+import hashlib
+import io as std_io
+import os
+import pickle
+import sys
+
+from docutils import io, nodes, utils
+
+from lddocutils import sections
+from lddocutils.ldwriter import Writer
+from lddocutils.manifest import Manifest, fingerprint_settings, hash_file
+from lddocutils.publishing import (
+    apply_parse_transforms,
+    detached,
+    new_publisher,
+    renderer,
+)
+
+
+@contextlib.contextmanager
+def captured_warnings(settings):
+    """Captures the messages which are written to the warning stream; they
+    are written to the warning stream when the block is left."""
+    (warning_stream, settings.warning_stream) = (
+        settings.warning_stream,
+        std_io.StringIO(),
+    )
+    messages = settings.warning_stream
+    try:
+        yield messages
+    finally:
+        settings.warning_stream = warning_stream
+        io.ErrorOutput(warning_stream).write(messages.getvalue())
+
+
+def writer_settings(writer_class=Writer):
+    """The names of the settings of the writer (including those inherited
+    from docutils' HTML writer)."""
+    names = set()
+    for options in writer_class.settings_spec[2::3]:
+        for _, flags, kwargs in options:
+            long_flag = next(flag for flag in flags if flag.startswith("--"))
+            names.add(kwargs.get("dest") or long_flag[2:].replace("-", "_"))
+    return frozenset(names)
+
+
+class DoctreeCache:
+    def __init__(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+
+    def path(self, name):
+        return os.path.join(self.directory, name)
+
+    def index_path(self, source, suffix=".index"):
+        name = hashlib.sha256(os.path.abspath(source).encode()).hexdigest()
+        return self.path(name + suffix)
+
+    def load(self, source, parse_fingerprint):
+        """Returns the cached doctree, its dependencies and the messages
+        (text and maximum level) reported while parsing it or (None, None,
+        None)."""
+        try:
+            with open(self.index_path(source)) as index:
+                (key, *dependencies) = index.read().splitlines()
+            if key != Manifest.fingerprint(source, dependencies, parse_fingerprint):
+                return (None, None, None)
+            with open(self.path(key + ".doctree"), "rb") as file:
+                (document, messages, max_level) = pickle.load(file)
+            return (document, dependencies, (messages, max_level))
+        except (OSError, ValueError, pickle.UnpicklingError):
+            return (None, None, None)
+
+    def store(self, source, parse_fingerprint, document, dependencies, reported):
+        """`reported` are the messages (text and maximum level) reported
+        while parsing the document."""
+        key = Manifest.fingerprint(source, dependencies, parse_fingerprint)
+        try:
+            with open(self.index_path(source)) as index:
+                old_key = index.readline().strip()
+            if old_key != key:
+                os.remove(self.path(old_key + ".doctree"))
+        except OSError:
+            pass
+
+        doctree_path = self.path(key + ".doctree")
+        # Worker processes (see --batch) may write the same file.
+        temporary = f"{doctree_path}.{os.getpid()}.tmp"
+        with detached(document), open(temporary, "wb") as file:
+            pickle.dump(
+                (document, *reported), file, protocol=pickle.HIGHEST_PROTOCOL
+            )
+        os.replace(temporary, doctree_path)
+        with open(self.index_path(source), "w") as index:
+            index.write("\n".join([key, *dependencies]) + "\n")
+
+    def parse(self, publisher, parse_fingerprint):
+        """Reads the document and applies the reader's and parser's transforms
+        (but not the writer's transforms)."""
+        publisher.set_io()
+        text = publisher.source.read()
+        messages = std_io.StringIO()
+        try:
+            document = self.parse_slides(publisher, text, parse_fingerprint, messages)
+        except sections.SectionConflict:
+            # The messages are reported (again) while parsing the whole document.
+            messages = None
+            document = utils.new_document(
+                publisher.source.source_path, publisher.settings
+            )
+            publisher.parser.parse(text, document)
+        finally:
+            if messages is not None:
+                io.ErrorOutput(publisher.settings.warning_stream).write(
+                    messages.getvalue()
+                )
+        document.current_source = document.current_line = None
+        apply_parse_transforms(publisher, document)
+        return document
+
+    def parse_slides(self, publisher, text, parse_fingerprint, messages):
+        """Parses the document slide by slide; only the slides which are not
+        cached are parsed. The messages are written to `messages`.
+
+        Raises `SectionConflict` if the document has to be parsed as a
+        whole."""
+        source_path = publisher.source.source_path
+        parser = publisher.parser
+        lines = text.splitlines()
+        (starts, has_title) = sections.split(lines)
+        prelude_end = starts[0]
+        prelude = "\n".join(lines[:prelude_end]) + "\n"
+
+        settings = copy.copy(publisher.settings)
+        settings.warning_stream = messages
+        document = utils.new_document(source_path, settings)
+        parser.parse(prelude, document)
+        parent = sections.slides_parent(document, has_title)
+        (document_length, parent_length) = (len(document), len(parent))
+        prelude_id_counter = collections.Counter(document.id_counter)
+
+        def parse_slide(start, slide, seed):
+            # The reported messages are stored with the slide; they are
+            # reported again when the cached slide is used.
+            reported = []
+
+            def report(message):
+                if message["level"] >= chunk.reporter.report_level and not (
+                    message.get("source") == source_path
+                    and (message.get("line") or 0) <= prelude_end
+                ):
+                    messages.write(message.astext() + "\n")
+                    reported.append(message.deepcopy())
+
+            chunk_settings = copy.copy(settings)
+            chunk_settings.record_dependencies = utils.DependencyList()
+            chunk = utils.new_document(source_path, chunk_settings)
+            # The prelude's messages were already reported.
+            chunk.reporter.stream = None
+            chunk.reporter.attach_observer(report)
+            chunk.id_counter = collections.Counter(seed)
+            # The padding ensures that the line numbers are correct.
+            parser.parse(prelude + "\n" * (start - prelude_end) + slide, chunk)
+
+            chunk_parent = sections.slides_parent(chunk, has_title)
+            slide_nodes = chunk_parent[parent_length:]
+            if (
+                len(chunk) != document_length
+                or not slide_nodes
+                or [n for n in slide_nodes if isinstance(n, nodes.section)]
+                != [slide_nodes[-1]]
+            ):
+                raise sections.SectionConflict("unexpected document structure")
+            fragment = sections.Fragment(
+                chunk, slide_nodes, seed, prelude_id_counter, prelude_end
+            )
+            fragment.start = start
+            fragment.reported = reported
+            fragment.dependencies = chunk_settings.record_dependencies.list
+            return fragment
+
+        keys = []
+        for start, end in zip(starts, starts[1:] + [len(lines)]):
+            slide = "\n".join(lines[start:end]) + "\n"
+            seed = sections.seed(document, prelude_id_counter)
+            # The key does not depend on the position of the slide; i.e., a
+            # slide is not parsed again if only the preceding slides changed.
+            # It depends on the path of the source because relative paths
+            # (e.g., of included files) are resolved relative to it; hence,
+            # the slides of different sources are never shared.
+            h = hashlib.sha256(parse_fingerprint.encode())
+            h.update(os.path.abspath(source_path).encode())
+            h.update(repr(sorted(seed.items())).encode())
+            h.update(prelude.encode())
+            h.update(slide.encode())
+            key = h.hexdigest()
+            keys.append(key)
+
+            fragment = self.load_slide(key)
+            if fragment is None:
+                fragment = parse_slide(start, slide, seed)
+                self.store_slide(key, fragment)
+            else:
+                fragment.move_to(start, source_path)
+                for message in fragment.reported:
+                    messages.write(message.astext() + "\n")
+            fragment.merge_into(document, parent)
+            publisher.settings.record_dependencies.add(*fragment.dependencies)
+
+        self.store_slides_index(publisher.source.source_path, keys)
+        document.settings = publisher.settings
+        max_level = document.reporter.max_level
+        document.reporter = utils.new_reporter(source_path, publisher.settings)
+        document.reporter.max_level = max_level
+        return document
+
+    @staticmethod
+    def dependencies_fingerprint(dependencies):
+        h = hashlib.sha256()
+        for path in dependencies:
+            h.update(path.encode())
+            h.update(hash_file(path).encode())
+        return h.hexdigest()
+
+    def load_slide(self, key):
+        try:
+            with open(self.path(key + ".slide"), "rb") as file:
+                (fragment, fingerprint) = pickle.load(file)
+        except (OSError, ValueError, pickle.UnpicklingError):
+            return None
+        if fingerprint != self.dependencies_fingerprint(fragment.dependencies):
+            return None
+        return fragment
+
+    def store_slide(self, key, fragment):
+        fingerprint = self.dependencies_fingerprint(fragment.dependencies)
+        slide_path = self.path(key + ".slide")
+        temporary = f"{slide_path}.{os.getpid()}.tmp"
+        with open(temporary, "wb") as file:
+            pickle.dump((fragment, fingerprint), file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temporary, slide_path)
+
+    def store_slides_index(self, source, keys):
+        """Removes the cached slides of the source which are no longer used.
+
+        This relies on the keys of the slides containing the path of the
+        source (see `parse_slides`): a cached slide belongs to exactly one
+        source."""
+        index_path = self.index_path(source, ".slides")
+        try:
+            with open(index_path) as index:
+                old_keys = set(index.read().split())
+        except OSError:
+            old_keys = set()
+        for key in old_keys - set(keys):
+            try:
+                os.remove(self.path(key + ".slide"))
+            except OSError:
+                pass
+        with open(index_path, "w") as index:
+            index.write("\n".join(keys) + "\n")
+
+    def publish(self, source, destination, docutils_args):
+        """Converts the document like `lddocutils.batch.publish`, but uses the
+        cached doctree if possible."""
+        publisher = new_publisher([*docutils_args, source, destination])
+        settings = publisher.settings
+        parse_fingerprint = fingerprint_settings(settings, writer_settings())
+        if settings.ld_cache_dir is None:
+            settings.ld_cache_dir = self.directory
+
+        (document, dependencies, reported) = self.load(source, parse_fingerprint)
+        if document is None:
+            try:
+                with captured_warnings(settings) as messages:
+                    document = self.parse(publisher, parse_fingerprint)
+            except utils.SystemMessage as error:
+                publisher.report_SystemMessage(error)
+                sys.exit(1)
+            dependencies = [
+                dependency
+                for dependency in settings.record_dependencies.list
+                if dependency != source
+            ]
+            reported = (messages.getvalue(), document.reporter.max_level)
+            self.store(source, parse_fingerprint, document, dependencies, reported)
+        else:
+            settings.record_dependencies.add(*dependencies)
+            io.ErrorOutput(settings.warning_stream).write(reported[0])
+
+        # The renderer creates a new reporter; the level of the messages
+        # reported while parsing is taken into account explicitly.
+        publisher = renderer(document, settings, destination, publisher.writer)
+        publisher.publish()
+        max_level = max(reported[1], publisher.document.reporter.max_level)
+        if max_level >= settings.exit_status_level:
+            sys.exit(max_level + 10)
+        return publisher
@@ -1,15 +1,17 @@
-import base64
 import hashlib
+import hmac
+import importlib
 import json
 import os
+import re
+import tempfile
 import textwrap
 from itertools import batched
+from pathlib import Path
 
-from Crypto.Cipher import AES
-from Crypto.Hash import SHA256, SHA512
-from Crypto.Protocol.KDF import PBKDF2
-from Crypto.Random import get_random_bytes
-from docutils import frontend, nodes
+from docutils import frontend, nodes, utils
+from docutils import io as docutils_io
+from docutils import languages
 from docutils.nodes import Element, General, container, inline, make_id, rubric, title
 from docutils.parsers.rst import Directive, directives, roles
 from docutils.parsers.rst.directives import (
@@ -18,8 +20,31 @@ from docutils.parsers.rst.directives import (
     unchanged,
     unchanged_required,
 )
+from docutils import writers
 from docutils.writers import html5_polyglot
 
+from lddocutils.ldwriter.crypto_backends import (
+    ldGILFreeKDFBackends,
+    ldKDFBackends,
+    resolve_backend,
+)
+from lddocutils.ldwriter.encryption import (
+    deriveKEK,
+    draftEnvelope,
+    encryptAESGCM,
+    encryptAESGCMWithKEK,
+    kekSalt,
+    ldPBKDF2IterationCount,
+)
+from lddocutils.ldwriter.transforms import (
+    HideSlides,
+    SelectVariant,
+    ValidateStructure,
+    ldClearVariants,
+    ldVariants,
+    located,
+)
+
 """
 Writer for LectureDoc2 HTML output.
 
@@ -72,6 +97,213 @@ class Writer(html5_polyglot.Writer):
                     "validator": validate_modules_list,
                 },
             ),
+            (
+                "Directory in which encrypted solutions and presenter notes are "
+                "cached across runs. (Default: no caching.)",
+                ["--ld-cache-dir"],
+                {"metavar": "<DIR>"},
+            ),
+            (
+                "Maximum size (in MiB) of the encryption cache; the least recently "
+                "used entries are evicted first. (Default: 64)",
+                ["--ld-cache-size"],
+                {
+                    "metavar": "<MiB>",
+                    "default": 64,
+                    "validator": frontend.validate_nonnegative_int,
+                },
+            ),
+            (
+                "Write a (make/ninja compatible) depfile which lists all files "
+                "the conversion read (the source, included files, images and the "
+                "theme).",
+                ["--ld-depfile"],
+                {"metavar": "<FILE>"},
+            ),
+            (
+                "Number of processes used to encrypt solutions and presenter "
+                "notes; 0 uses all available cores. (Default: 1)",
+                ["--ld-jobs"],
+                {
+                    "metavar": "<N>",
+                    "default": 1,
+                    "validator": frontend.validate_nonnegative_int,
+                },
+            ),
+            (
+                "Derivation of the keys used to encrypt solutions and presenter "
+                'notes: "block" derives the key of each block using PBKDF2; '
+                '"document" derives one key per password and document using '
+                "PBKDF2 and the keys of the blocks using HKDF (requires a "
+                "LectureDoc2 version which supports this format). "
+                '(Default: "block")',
+                ["--ld-key-derivation"],
+                {
+                    "metavar": "<block|document>",
+                    "choices": ["block", "document"],
+                    "default": "block",
+                },
+            ),
+            (
+                'Library used for the PBKDF2 key derivation: "hashlib" (OpenSSL) '
+                'or "pycryptodome"; "auto" uses hashlib. Use '
+                '"python3 -m lddocutils.ldwriter.crypto_calibration" to measure the '
+                'performance of the backends. (Default: "auto")',
+                ["--ld-crypto-backend"],
+                {
+                    "metavar": "<auto|hashlib|pycryptodome>",
+                    "choices": ["auto", *ldKDFBackends],
+                    "default": "auto",
+                },
+            ),
+            (
+                "Compress (deflate) solutions and presenter notes before they "
+                "are encrypted (requires a LectureDoc2 version which supports "
+                "compressed content).",
+                ["--ld-compress-encrypted"],
+                {
+                    "default": False,
+                    "action": "store_true",
+                    "validator": frontend.validate_boolean,
+                },
+            ),
+            (
+                "Store the encrypted solutions and presenter notes in a separate "
+                'file ("<output file>.encrypted.json") which is only loaded when '
+                "needed (requires a LectureDoc2 version which supports this).",
+                ["--ld-encrypted-sidecar"],
+                {
+                    "default": False,
+                    "action": "store_true",
+                    "validator": frontend.validate_boolean,
+                },
+            ),
+            (
+                "Derive the passwords of solutions without an explicit password "
+                "from the master password and the exercise's title (instead of "
+                "generating random passwords); unchanged exercises then result "
+                "in identical output.",
+                ["--ld-derive-passwords"],
+                {
+                    "default": False,
+                    "action": "store_true",
+                    "validator": frontend.validate_boolean,
+                },
+            ),
+            (
+                "Draft mode for previews: solutions and presenter notes are not "
+                "encrypted, but only marked as drafts. Never publish drafts!",
+                ["--ld-draft"],
+                {
+                    "default": False,
+                    "action": "store_true",
+                    "validator": frontend.validate_boolean,
+                },
+            ),
+            (
+                "Stream the topics to the output file as soon as they are "
+                "translated instead of keeping the whole document in memory. "
+                "(The document parts, e.g., html_body, are then incomplete.)",
+                ["--ld-stream"],
+                {
+                    "default": False,
+                    "action": "store_true",
+                    "validator": frontend.validate_boolean,
+                },
+            ),
+            (
+                "Only check the structure of the document (e.g., that exercises "
+                "are not nested); the document is neither translated nor written.",
+                ["--ld-check"],
+                {
+                    "default": False,
+                    "action": "store_true",
+                    "validator": frontend.validate_boolean,
+                },
+            ),
+            (
+                'The variant of the document which is generated: "slides"; '
+                '"exercise-sheet" (the slides with exercises, without solutions '
+                'and presenter notes); "solutions" (the slides with exercises, '
+                'the solutions are not encrypted) or "presenter-notes" (the '
+                "titles of the slides and their unencrypted presenter notes). "
+                "Only the slides write the passwords file. "
+                '(Default: "slides")',
+                ["--ld-variant"],
+                {
+                    "metavar": "<slides|exercise-sheet|solutions|presenter-notes>",
+                    "choices": ldVariants,
+                    "default": "slides",
+                },
+            ),
+            (
+                "Generate a search index of the slides (encrypted solutions and "
+                'presenter notes are not indexed): "embed" embeds the index in '
+                'the document; "sidecar" stores it in a separate file '
+                '("<output file>.search.json"). (Default: no search index.)',
+                ["--ld-search-index"],
+                {"metavar": "<embed|sidecar>", "choices": ["embed", "sidecar"]},
+            ),
+            (
+                "Write the slides after the first N slides to separate files "
+                '("<output file>.topics/<id>.html"; the directory also contains '
+                'an index: "index.json") which are loaded on demand (requires a '
+                "LectureDoc2 version which supports this). (Default: all slides "
+                "are embedded.)",
+                ["--ld-lazy-topics"],
+                {
+                    "metavar": "<N>",
+                    "validator": frontend.validate_nonnegative_int,
+                },
+            ),
+            (
+                "Directory to which the (local) images are copied; the names of "
+                "the copies contain the hash of their content and the images are "
+                "referenced using the copies. Hence, the images can be cached "
+                "for an unlimited time. (Default: the images are referenced "
+                "as is.)",
+                ["--ld-assets-dir"],
+                {"metavar": "<DIR>"},
+            ),
+            (
+                "Embed SVG images (except of icons) whose size is at most the "
+                "given number of bytes in the document instead of referencing "
+                "them using object elements. (Default: SVG images are not "
+                "embedded.)",
+                ["--ld-inline-svg-max"],
+                {
+                    "metavar": "<BYTES>",
+                    "validator": frontend.validate_nonnegative_int,
+                },
+            ),
+            (
+                "Add the intrinsic dimensions of (local) images without an "
+                "explicit width and height to the image elements; the dimensions "
+                "are read from the headers of PNG, JPEG, WebP and GIF images and "
+                "from the root elements of SVG images (if an SVG image only has "
+                "a viewBox, its aspect ratio is set). The dimensions are cached "
+                "in the directory specified using --ld-cache-dir.",
+                ["--ld-image-dimensions"],
+                {
+                    "default": False,
+                    "action": "store_true",
+                    "validator": frontend.validate_boolean,
+                },
+            ),
+            (
+                "Write the global SVG definitions and styles (meta information "
+                "svg-defs and svg-style) to a shared file in the assets directory "
+                "(see --ld-assets-dir) instead of embedding them; the name of the "
+                "file contains the hash of its content. Hence, documents with the "
+                "same definitions share the file (requires a LectureDoc2 version "
+                "which supports this).",
+                ["--ld-shared-svg-globals"],
+                {
+                    "default": False,
+                    "action": "store_true",
+                    "validator": frontend.validate_boolean,
+                },
+            ),
         ),
     )
 
@@ -81,6 +313,108 @@ class Writer(html5_polyglot.Writer):
     def __init__(self):
         html5_polyglot.Writer.__init__(self)
         self.translator_class = LDTranslator
+        self.ld_streaming = False
+
+    def get_transforms(self):
+        return super().get_transforms() + [
+            ValidateStructure,
+            HideSlides,
+            SelectVariant,
+        ]
+
+    def write(self, document, destination):
+        """In streaming mode (`--ld-stream`), the translator writes the
+        finished topics to a spool file; the output is then written piecewise:
+        the part of the template before the body, the spooled topics and the
+        rest."""
+        if document.settings.ld_check:
+            # The structure was checked by the ValidateStructure transform.
+            self.document = document
+            self.destination = destination
+            self.output = None
+            return self.output
+
+        template = Path(document.settings.template).read_text(encoding="utf-8")
+        self.ld_streaming = (
+            document.settings.ld_stream
+            and isinstance(destination, docutils_io.FileOutput)
+            and template.count("%(body)s") == 1
+        )
+        if not self.ld_streaming:
+            return super().write(document, destination)
+
+        self.document = document
+        self.language = languages.get_language(
+            document.settings.language_code, document.reporter
+        )
+        self.destination = destination
+        self.translate()
+        (prefix, suffix) = template.split("%(body)s")
+        subs = self.interpolation_dict()
+        spool = self.visitor.spool
+        autoclose = destination.autoclose
+        destination.autoclose = False
+        try:
+            destination.write(prefix % subs)
+            spool.seek(0)
+            while chunk := spool.read(1024 * 1024):
+                destination.write(chunk)
+            destination.write(subs["body"] + suffix % subs)
+        finally:
+            spool.close()
+            destination.autoclose = autoclose
+            if autoclose:
+                destination.close()
+        self.output = None
+        return self.output
+
+    def translate(self):
+        if not self.ld_streaming:
+            return super().translate()
+        self.visitor = visitor = self.translator_class(self.document)
+        visitor.spool = tempfile.TemporaryFile("w+", encoding="utf-8")
+        self.document.walkabout(visitor)
+        for attr in self.visitor_attributes:
+            setattr(self, attr, getattr(visitor, attr))
+
+    def assemble_parts(self):
+        if self.document.settings.ld_check:
+            writers.Writer.assemble_parts(self)
+            return
+        super().assemble_parts()
+        # The master password and the passwords of the exercises (as written
+        # to the file specified using `--ld-passwords`).
+        self.parts["passwords"] = self.visitor.passwords
+        # The files written in addition to the output file.
+        self.parts["outputs"] = self.visitor.outputs
+
+
+def formatPassword(data):
+    """Maps the bytes to lowercase letters; 'dashes' are added after every
+    third letter for readability."""
+    b = batched(
+        bytearray(map(lambda i: i % (122 - 97) + 97, data)).decode("UTF-8"),
+        3,
+    )
+    m = map(lambda t: "".join(t), b)
+    return "-".join(m)
+
+
+def depfile_escape(path):
+    return path.replace("$", "$$").replace("#", "\\#").replace(" ", "\\ ")
+
+
+def write_depfile(depfile, target, dependencies):
+    """Writes a GCC-style depfile. As with "gcc -MP", an empty rule is
+    written for each dependency; hence, make does not fail if a dependency
+    (e.g., an included file or an image) is deleted or renamed."""
+    with open(depfile, "w") as file:
+        file.write(depfile_escape(target) + ":")
+        for dependency in dependencies:
+            file.write(" \\\n  " + depfile_escape(dependency))
+        file.write("\n")
+        for dependency in dependencies:
+            file.write("\n" + depfile_escape(dependency) + ":\n")
 
 
 def generatePassword(length=8):
@@ -95,39 +429,25 @@ def generatePassword(length=8):
     which will not be graded or otherwise evaluated. It is just meant
     to keep the students from looking them up too easily.
     """
+    from Crypto.Random import get_random_bytes
+
     assert length > 3
-    b = batched(
-        bytearray(map(lambda i: i % (122 - 97) + 97, get_random_bytes(8))).decode(
-            "UTF-8"
-        ),
-        3,
-    )
-    m = map(lambda t: "".join(t), b)
-    return "-".join(m)
+    return formatPassword(get_random_bytes(8))
 
 
-ldPBKDF2IterationCount = 100000
-
-
-def encryptAESGCM(pwd, plaintext, iterationCount=ldPBKDF2IterationCount):
-    # The following encryption scheme is compatible with the one used by LectureDoc2.
-    # Additionally, we want to encrypt the content in the same way when we
-    # didn't change the content.
-    base_hash = hashlib.sha512(plaintext.encode("utf-8")).digest()
-    salt = base_hash[:32]  # get_random_bytes(32)
-    iv = base_hash[32:44]  # get_random_bytes(12)
-    aesKey = PBKDF2(pwd, salt, dkLen=32, count=iterationCount, hmac_hash_module=SHA256)
-    cipher = AES.new(aesKey, AES.MODE_GCM, nonce=iv, mac_len=16)
-    (ciphertext, tag) = cipher.encrypt_and_digest(plaintext.encode("utf-8"))
-    return (
-        base64.b64encode(str(iterationCount).encode("utf-8")).decode("utf-8")
-        + ":"
-        + base64.b64encode(salt).decode("utf-8")
-        + ":"
-        + base64.b64encode(iv).decode("utf-8")
-        + ":"
-        + base64.b64encode(ciphertext + tag).decode("utf-8")
-    )
+def derivePassword(master_password, identifier):
+    """Derives a password from the master password and the (stable)
+    identifier of an exercise; the same identifier always results in the
+    same password (see `--ld-derive-passwords`)."""
+    digest = hmac.new(
+        master_password.encode("utf-8"), identifier.encode("utf-8"), hashlib.sha256
+    ).digest()
+    return formatPassword(digest[:8])
+
+
+# Placeholder for an encrypted block in the translator's body; see
+# LDTranslator.encrypt.
+ldEncryptionPlaceholder = re.compile("\x00ld-encrypted-([0-9]+)\x00")
 
 
 def make_classes(arguments: list[str]) -> list[str]:
@@ -224,11 +544,11 @@ class Solution(Directive):
         text = "\n".join(self.content)
         node = solution(rawsource=text)
 
-        if "pwd" not in self.options:
-            node.attributes["pwd"] = generatePassword()
-        elif len(self.options["pwd"]) < 3:
-            raise self.error('solution password too short: ":pwd: <password>"')
-        else:
+        # If no password is given, the translator generates one (see
+        # LDTranslator.solution_password).
+        if "pwd" in self.options:
+            if len(self.options["pwd"]) < 3:
+                raise self.error('solution password too short: ":pwd: <password>"')
             node.attributes["pwd"] = self.options["pwd"]
 
         node.attributes["classes"] = ["ld-exercise-solution"]
@@ -426,6 +746,83 @@ class LDTranslator(html5_polyglot.HTMLTranslator):
         self.ld_path = self.document.settings.ld_path
         self.ld_theme_path = self.document.settings.theme
         self.ld_passwords_file = self.document.settings.ld_passwords
+        # The solutions and presenter notes of some variants are not encrypted;
+        # only the slides use (and write) the passwords.
+        self.ld_clear = self.document.settings.ld_variant in ldClearVariants
+        if self.document.settings.ld_variant != "slides":
+            self.ld_passwords_file = None
+
+        self.encryption_cache = None
+        if self.document.settings.ld_cache_dir is not None:
+            from lddocutils.ldwriter.encryption_cache import EncryptionCache
+
+            self.encryption_cache = EncryptionCache(
+                self.document.settings.ld_cache_dir,
+                self.document.settings.ld_cache_size * 1024 * 1024,
+            )
+        self.ld_jobs = self.document.settings.ld_jobs or os.cpu_count()
+        self.ld_key_derivation = self.document.settings.ld_key_derivation
+        self.ld_draft = self.document.settings.ld_draft
+        # The file to which the finished topics are written in streaming mode
+        # (set by the Writer); see flush_topics.
+        self.spool = None
+        self.ld_compress_encrypted = self.document.settings.ld_compress_encrypted
+        self.ld_crypto_backend = resolve_backend(
+            self.document.settings.ld_crypto_backend
+        )
+        # The key encryption keys (per password and iteration count) which are
+        # used when the keys are derived per document.
+        self.kek_salt = kekSalt(os.path.basename(self.document["source"]))
+        self.key_encryption_keys = {}
+        # The encryption of solutions and presenter notes is deferred until
+        # the end of the document; each job is a tuple:
+        # (password, plaintext, iteration count)
+        self.encryption_jobs = []
+
+        # If the encrypted blocks are stored in a sidecar file, the blocks are
+        # referenced using the "data-encrypted-ref" attribute.
+        self.ld_encrypted_sidecar = None
+        if self.document.settings.ld_encrypted_sidecar:
+            destination = self.document.settings._destination
+            if destination:
+                self.ld_encrypted_sidecar = destination + ".encrypted.json"
+            else:
+                self.document.reporter.warning(
+                    "--ld-encrypted-sidecar requires an output file; "
+                    "the encrypted content is embedded."
+                )
+        self.encrypted_sidecar = {}
+
+        # The target of the depfile is the output file.
+        if (
+            self.document.settings.ld_depfile is not None
+            and not self.document.settings._destination
+        ):
+            self.document.reporter.severe(
+                "--ld-depfile requires an output file; no depfile is written.",
+                base_node=self.document,
+            )
+
+        # The search index is built while the slides are translated; see
+        # visit_document and visit_section.
+        self.search_index = None
+        self.ld_search_index_sidecar = None
+        if self.document.settings.ld_search_index is not None:
+            from lddocutils.ldwriter.search_index import SearchIndex
+
+            encrypted = [] if self.ld_clear else ["solution", "presenter_note"]
+            self.search_index = SearchIndex(encrypted)
+            destination = self.document.settings._destination
+            if self.document.settings.ld_search_index == "sidecar":
+                if destination:
+                    self.ld_search_index_sidecar = destination + ".search.json"
+                else:
+                    self.document.reporter.warning(
+                        "--ld-search-index sidecar requires an output file; "
+                        "the search index is embedded."
+                    )
+        # Maps the indexes of the encryption jobs to the keys in the sidecar.
+        self.encryption_jobs_sidecar_keys = {}
 
         # Overwrite HTMLTranslator's meta tag default
         self.meta = [
@@ -438,21 +835,67 @@ class LDTranslator(html5_polyglot.HTMLTranslator):
         # added before the template element which contains the document's content.
         self.svg_style = None
         self.svg_defs = None
+        # The shared file which contains the global definitions (if any).
+        self.ld_shared_svg_globals = self.document.settings.ld_shared_svg_globals
+        self.svg_globals_file = None
 
         self.section_count = 0
+        # The number of slides (i.e., the top-level sections).
+        self.slide_count = 0
+
+        # The slides which are loaded on demand (see `--ld-lazy-topics`) are
+        # written to the topics directory; each topic is a tuple: (file name,
+        # fragments). The index lists the topics: (id, title, source).
+        self.ld_lazy_topics = self.document.settings.ld_lazy_topics
+        self.topics_directory = None
+        if self.ld_lazy_topics is not None:
+            destination = self.document.settings._destination
+            if destination:
+                self.topics_directory = destination + ".topics"
+            else:
+                self.document.reporter.warning(
+                    "--ld-lazy-topics requires an output file; all slides "
+                    "are embedded."
+                )
+        self.lazy_topics = []
+        self.topics_index = []
+        self.start_of_topic = None
+
+        # The files which are written in addition to the output file (e.g.,
+        # the passwords file or the assets); see `record_output`.
+        self.outputs = []
+
+        # The asset pipeline; see visit_image.
+        self.assets = None
+        if self.document.settings.ld_assets_dir is not None:
+            from lddocutils.ldwriter.assets import Assets
+
+            self.assets = Assets(self.document.settings.ld_assets_dir)
+        self.ld_inline_svg_max = self.document.settings.ld_inline_svg_max
+        # The (ids of the) image nodes whose SVGs were embedded.
+        self.inlined_svgs = set()
+        self.image_dimensions = None
+        if self.document.settings.ld_image_dimensions:
+            from lddocutils.ldwriter.images import ImageDimensions
+
+            self.image_dimensions = ImageDimensions(
+                self.document.settings.ld_cache_dir
+            )
         self.card_count = []
 
-        # Identifies the first tag belonging to a slide which should be hidden;
-        # i. e., which will not be in the generated output.
-        self.start_of_slide_to_hide = None
-
         # The following attributes are used to handle exercises and solutions
         self.start_of_exercise = None
         self.current_exercise_name = None
+        self.current_exercise_identifier = None
         self.start_of_solution = None
         self.exercises_passwords = []
         self.exercises_passwords_titles = {}
+        # All passwords (including the master password); see depart_document.
+        self.passwords = []
         self.exercise_count = 0
+        # The number of exercises per title; used to derive stable
+        # identifiers of exercises (see solution_password).
+        self.exercise_title_counts = {}
 
         self.master_password = None
 
@@ -461,7 +904,177 @@ class LDTranslator(html5_polyglot.HTMLTranslator):
 
     def visit_document(self, node):
         super().visit_document(node)
-        pass
+        if self.image_dimensions is not None:
+            paths = []
+            for image in node.findall(nodes.image):
+                try:
+                    paths.append(self.uri2path(image["uri"]))
+                except ValueError:
+                    pass  # remote images
+            self.image_dimensions.prefetch(paths, self.ld_jobs)
+        if self.search_index is not None:
+            # The title slide consists of everything before the first slide.
+            self.search_index.add_topic(
+                next(iter(node.ids)),
+                node.get("title", ""),
+                [child for child in node if not isinstance(child, nodes.section)],
+            )
+
+    def encrypt(
+        self, pwd, plaintext, iterationCount=ldPBKDF2IterationCount, sidecar_key=None
+    ):
+        """Schedules the encryption of the plaintext and returns a placeholder
+        which is replaced by the encrypted content at the end of the document.
+
+        This enables us to encrypt all blocks at once using multiple
+        processes (see `--ld-jobs`).
+
+        If a `sidecar_key` is given and the encrypted blocks are stored in
+        a sidecar file, the placeholder is removed and the encrypted content
+        is stored in the sidecar file using the given key.
+        """
+        placeholder = f"\x00ld-encrypted-{len(self.encryption_jobs)}\x00"
+        if sidecar_key is not None and self.ld_encrypted_sidecar is not None:
+            self.encryption_jobs_sidecar_keys[len(self.encryption_jobs)] = sidecar_key
+        self.encryption_jobs.append((pwd, plaintext, iterationCount))
+        return placeholder
+
+    def run_encryption_jobs(self):
+        """Encrypts all scheduled blocks and replaces the placeholders.
+
+        If a block contains other encrypted blocks (e.g., a presenter note
+        with an exercise), the plaintext contains the placeholders of the
+        nested blocks; such blocks are encrypted after the nested blocks.
+        """
+        jobs = self.encryption_jobs
+        envelopes = [None] * len(jobs)
+
+        def envelope_of(match):
+            i = int(match.group(1))
+            if i in self.encryption_jobs_sidecar_keys:
+                return ""
+            return envelopes[i]
+
+        pending = list(range(len(jobs)))
+        while pending:
+            ready = [
+                i for i in pending if not ldEncryptionPlaceholder.search(jobs[i][1])
+            ]
+            assert ready, "cyclic encryption jobs"
+            encrypted_blocks = self.encrypt_blocks([jobs[i] for i in ready])
+            for i, envelope in zip(ready, encrypted_blocks):
+                envelopes[i] = envelope
+            pending = [i for i in pending if envelopes[i] is None]
+            for i in pending:
+                (pwd, plaintext, iterationCount) = jobs[i]
+                plaintext = ldEncryptionPlaceholder.sub(envelope_of, plaintext)
+                jobs[i] = (pwd, plaintext, iterationCount)
+
+        lazy_topics = [fragments for (_, fragments) in self.lazy_topics]
+        for fragments in (self.meta, self.body, *lazy_topics):
+            for i, fragment in enumerate(fragments):
+                if "\x00" in fragment:
+                    fragments[i] = ldEncryptionPlaceholder.sub(envelope_of, fragment)
+        for i, key in self.encryption_jobs_sidecar_keys.items():
+            self.encrypted_sidecar[key] = envelopes[i]
+        self.encryption_jobs = []
+        self.encryption_jobs_sidecar_keys = {}
+
+    def flush_topics(self):
+        """Streaming mode: writes the finished topics to the spool file.
+
+        The last fragment is kept to enable the Writer to strip the trailing
+        newline of the body (as docutils does)."""
+        if self.spool is None:
+            return
+        self.run_encryption_jobs()
+        self.write_lazy_topics()
+        self.spool.write("".join(self.body[:-1]))
+        del self.body[:-1]
+
+    def encrypt_blocks(self, jobs):
+        """Encrypts the given blocks; previously encrypted blocks are taken
+        from the encryption cache (if configured)."""
+        if self.ld_draft:
+            return [draftEnvelope(plaintext) for (_, plaintext, _) in jobs]
+
+        if self.ld_key_derivation == "document":
+            encrypt = self.encrypt_blocks_with_document_keys
+            cache_parameters = [
+                (job[2], self.ld_compress_encrypted, "hkdf-sha256", self.kek_salt)
+                for job in jobs
+            ]
+        else:
+            encrypt = self.encrypt_blocks_with_block_keys
+            cache_parameters = [(job[2], self.ld_compress_encrypted) for job in jobs]
+
+        if self.encryption_cache is None:
+            envelopes = [None] * len(jobs)
+        else:
+            envelopes = [
+                self.encryption_cache.get(job[0], job[1], parameters)
+                for job, parameters in zip(jobs, cache_parameters)
+            ]
+        missing = [i for i, envelope in enumerate(envelopes) if envelope is None]
+
+        for i, envelope in zip(missing, encrypt([jobs[i] for i in missing])):
+            envelopes[i] = envelope
+            if self.encryption_cache is not None:
+                (pwd, plaintext, _) = jobs[i]
+                self.encryption_cache.put(pwd, plaintext, cache_parameters[i], envelope)
+        return envelopes
+
+    def map(self, function, *iterables):
+        """Maps the (key deriving) function over the iterables using up to
+        `--ld-jobs` threads or - if the crypto backend holds the GIL -
+        processes."""
+        arguments = list(zip(*iterables))
+        if self.ld_jobs > 1 and len(arguments) > 1:
+            from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+            if self.ld_crypto_backend in ldGILFreeKDFBackends:
+                Executor = ThreadPoolExecutor
+            else:
+                Executor = ProcessPoolExecutor
+            with Executor(min(self.ld_jobs, len(arguments))) as executor:
+                return list(executor.map(function, *zip(*arguments)))
+        else:
+            return [function(*args) for args in arguments]
+
+    def encrypt_blocks_with_block_keys(self, jobs):
+        return self.map(
+            encryptAESGCM,
+            *zip(*jobs),
+            [self.ld_crypto_backend] * len(jobs),
+            [self.ld_compress_encrypted] * len(jobs),
+        )
+
+    def encrypt_blocks_with_document_keys(self, jobs):
+        missing_keys = list(
+            {
+                (pwd, iterationCount)
+                for (pwd, _, iterationCount) in jobs
+                if (pwd, iterationCount) not in self.key_encryption_keys
+            }
+        )
+        keks = self.map(
+            deriveKEK,
+            [pwd for (pwd, _) in missing_keys],
+            [self.kek_salt] * len(missing_keys),
+            [iterationCount for (_, iterationCount) in missing_keys],
+            [self.ld_crypto_backend] * len(missing_keys),
+        )
+        self.key_encryption_keys.update(zip(missing_keys, keks))
+        return [
+            encryptAESGCMWithKEK(
+                self.key_encryption_keys[(pwd, iterationCount)],
+                self.kek_salt,
+                plaintext,
+                iterationCount,
+                self.ld_compress_encrypted,
+            )
+            for (pwd, plaintext, iterationCount) in jobs
+        ]
 
     def analyze_classes(self, node):
         required_modules = set()
@@ -483,6 +1096,12 @@ class LDTranslator(html5_polyglot.HTMLTranslator):
                 self.theme_template
                 % {"ld_path": ld_path, "theme_path": "/" + self.ld_theme_path}
             )
+            try:
+                self.settings.record_dependencies.add(
+                    self.uri2path(ld_path + "/" + self.ld_theme_path)
+                )
+            except ValueError:
+                pass  # LectureDoc2 is referenced using a URL
 
         self.meta.append(f'<meta name="version" content="LD2 RENAISSANCE" />\n')
 
@@ -496,21 +1115,71 @@ class LDTranslator(html5_polyglot.HTMLTranslator):
             passwordsJSON = "[\n]"
 
         if self.master_password is not None:
-            encryptedPWDs = encryptAESGCM(self.master_password, passwordsJSON, 100000)
+            # In draft mode, the solutions are not encrypted; hence, the
+            # passwords are not needed. The other variants contain no
+            # encrypted content either; the (expensive) key derivation is
+            # skipped. The slides always get the meta: the viewer uses it
+            # to check the master password.
+            if not self.ld_draft and self.document.settings.ld_variant == "slides":
+                encryptedPWDs = self.encrypt(
+                    self.master_password, passwordsJSON, 100000
+                )
+                self.meta.append(
+                    f'<meta name="exercises-passwords" content="{encryptedPWDs}" />\n',
+                )
+
+            passwords.insert(0, {"master password": self.master_password})
+        self.passwords = passwords
+
+        self.run_encryption_jobs()
+        if self.encryption_cache is not None:
+            self.encryption_cache.close()
+        if self.image_dimensions is not None:
+            self.image_dimensions.save()
+
+        if self.topics_directory is not None:
+            self.write_lazy_topics()
+            self.write_topics_index()
+
+        if self.ld_encrypted_sidecar is not None:
+            with open(self.ld_encrypted_sidecar, "w") as sidecarFile:
+                json.dump(self.encrypted_sidecar, sidecarFile, indent=0)
+            self.record_output(self.ld_encrypted_sidecar)
             self.meta.append(
-                f'<meta name="exercises-passwords" content="{encryptedPWDs}" />\n',
+                '<meta name="encrypted-content" content="'
+                + os.path.basename(self.ld_encrypted_sidecar)
+                + '" />\n'
             )
 
-            passwords.insert(0, {"master password": self.master_password})
+        if self.search_index is not None:
+            self.write_search_index()
+
+        if self.ld_shared_svg_globals and (self.svg_defs or self.svg_style):
+            self.write_svg_globals()
 
         if len(passwords) > 0 and self.ld_passwords_file is not None:
             with open(self.ld_passwords_file, "w") as passwordsFile:
                 json.dump(passwords, passwordsFile, indent=2, ensure_ascii=False)
+            self.record_output(self.ld_passwords_file)
 
         if len(self.exercises_passwords) > 0 and self.ld_passwords_file is not None:
             with open(self.ld_passwords_file + ".md", "w") as passwordsFile:
                 for key, value in self.exercises_passwords:
                     passwordsFile.write(f"- {key}: \t{value}\n")
+            self.record_output(self.ld_passwords_file + ".md")
+
+        if self.settings.ld_depfile is not None and self.settings._destination:
+            # The source is not a dependency if it is read from stdin.
+            sources = [self.settings._source] if self.settings._source else []
+            write_depfile(
+                self.settings.ld_depfile,
+                self.settings._destination,
+                [
+                    *sources,
+                    *self.settings._config_files,
+                    *self.settings.record_dependencies.list,
+                ],
+            )
 
         # let's search the DOM for classes that require special treatment
         # by JavaScript libraries, if we find any, we will add links to the
@@ -557,19 +1226,8 @@ class LDTranslator(html5_polyglot.HTMLTranslator):
         title_slide_classes = node.document["classes"]
         title_slide_id = next(iter(node.ids))
 
-        if self.svg_defs:
-            self.body_prefix.append(
-                '<svg xmlns="http://www.w3.org/2000/svg" class="svg-global-defs"><defs>'
-            )
-            self.body_prefix.append(self.svg_defs)
-            self.body_prefix.append("</defs></svg>\n")
-
-        if self.svg_style:
-            self.body_prefix.append(
-                '<svg xmlns="http://www.w3.org/2000/svg" class="svg-global-style"><style>'
-            )
-            self.body_prefix.append(self.svg_style)
-            self.body_prefix.append("</style></svg>\n")
+        if not self.svg_globals_file:
+            self.body_prefix.extend(self.svg_globals())
 
         self.body_prefix.append(self.starttag({}, "template"))
         self.body_suffix.insert(0, "</template>\n")
@@ -590,6 +1248,105 @@ class LDTranslator(html5_polyglot.HTMLTranslator):
             + self.body_suffix[:-1]
         )
 
+    def record_output(self, path):
+        """Records a file which was written in addition to the output file;
+        see `lddocutils.manifest`."""
+        path = os.fspath(path)
+        if path not in self.outputs:
+            self.outputs.append(path)
+
+    def write_lazy_topics(self):
+        """Writes the topics which are loaded on demand; the placeholders of
+        the encrypted blocks have to be replaced already."""
+        if not self.lazy_topics:
+            return
+        os.makedirs(self.topics_directory, exist_ok=True)
+        for file_name, fragments in self.lazy_topics:
+            path = os.path.join(self.topics_directory, file_name)
+            with open(path, "w", encoding="utf-8") as topicFile:
+                topicFile.write("".join(fragments))
+            self.record_output(path)
+        self.lazy_topics = []
+
+    def write_topics_index(self):
+        """Writes the index of the topics which are loaded on demand and
+        removes the files of topics which no longer exist."""
+        os.makedirs(self.topics_directory, exist_ok=True)
+        files = {source for (_, _, source) in self.topics_index}
+        for file_name in os.listdir(self.topics_directory):
+            if file_name.endswith(".html") and file_name not in files:
+                os.remove(os.path.join(self.topics_directory, file_name))
+        index_path = os.path.join(self.topics_directory, "index.json")
+        with open(index_path, "w", encoding="utf-8") as indexFile:
+            json.dump(
+                [
+                    {"id": topic_id, "title": title, "src": source}
+                    for (topic_id, title, source) in self.topics_index
+                ],
+                indexFile,
+                indent=0,
+                ensure_ascii=False,
+            )
+        self.record_output(index_path)
+        directory = os.path.basename(self.topics_directory)
+        self.meta.append(
+            f'<meta name="topics-index" content="{directory}/index.json" />\n'
+        )
+
+    def svg_globals(self):
+        """The global SVG definitions and styles (see visit_meta)."""
+        svg_globals = []
+        if self.svg_defs:
+            svg_globals.append(
+                '<svg xmlns="http://www.w3.org/2000/svg" class="svg-global-defs"><defs>'
+            )
+            svg_globals.append(self.svg_defs)
+            svg_globals.append("</defs></svg>\n")
+
+        if self.svg_style:
+            svg_globals.append(
+                '<svg xmlns="http://www.w3.org/2000/svg" class="svg-global-style"><style>'
+            )
+            svg_globals.append(self.svg_style)
+            svg_globals.append("</style></svg>\n")
+        return svg_globals
+
+    def write_svg_globals(self):
+        """Writes the global SVG definitions and styles to a (content-hashed)
+        file in the assets directory; documents with the same definitions
+        and styles share the file."""
+        if self.assets is None:
+            self.document.reporter.warning(
+                "--ld-shared-svg-globals requires --ld-assets-dir; the global "
+                "SVG definitions and styles are embedded."
+            )
+            return
+        path = self.assets.add_content("svg-globals.html", "".join(self.svg_globals()))
+        self.record_output(path)
+        self.svg_globals_file = utils.relative_path(self.settings._destination, path)
+        self.meta.append(
+            f'<meta name="svg-globals" content="{self.svg_globals_file}" />\n'
+        )
+
+    def write_search_index(self):
+        search_index = self.search_index.to_json()
+        if self.ld_search_index_sidecar is not None:
+            with open(self.ld_search_index_sidecar, "w") as indexFile:
+                indexFile.write(search_index)
+            self.record_output(self.ld_search_index_sidecar)
+            self.meta.append(
+                '<meta name="search-index" content="'
+                + os.path.basename(self.ld_search_index_sidecar)
+                + '" />\n'
+            )
+        else:
+            # "</" must not occur in the content of a script element.
+            self.meta.append(
+                '<script type="application/json" id="ld-search-index">'
+                + search_index.replace("</", "<\\/")
+                + "</script>\n"
+            )
+
     def visit_comment(self, node):
         super().visit_comment(node)
 
@@ -606,10 +1363,58 @@ class LDTranslator(html5_polyglot.HTMLTranslator):
             html5_polyglot.HTMLTranslator.visit_meta(self, node)
 
     def visit_image(self, node):
-        if (
+        # Images are (usually) not read; but they are part of the input
+        # (see lddocutils.manifest).
+        try:
+            path = self.uri2path(node["uri"])
+            self.settings.record_dependencies.add(path)
+        except ValueError:
+            path = None  # remote images
+        is_svg = (
             node.attributes["uri"].endswith(".svg")
             and not "icon" in node.attributes["classes"]
+        )
+        if is_svg and path is not None and self.ld_inline_svg_max is not None:
+            svg = self.read_small_svg(path)
+            if svg is not None:
+                self.inlined_svgs.add(id(node))
+                attributes = self.image_size(node)
+                if "align" in node.attributes:
+                    attributes["classes"] = ["align-" + node.attributes["align"]]
+                self.body.append(self.prepare_svg(svg, node, attributes))
+                return
+        aspect_ratio = None
+        if (
+            self.image_dimensions is not None
+            and path is not None
+            and "width" not in node
+            and "height" not in node
         ):
+            dimensions = self.image_dimensions.get(path)
+            if dimensions is not None and dimensions.intrinsic:
+                # Docutils applies the scale to the dimensions of img
+                # elements, but SVGs are embedded using object elements.
+                scale = node.get("scale", 100) / 100 if is_svg else 1
+                node["width"] = f"{round(dimensions.width * scale)}"
+                node["height"] = f"{round(dimensions.height * scale)}"
+            elif dimensions is not None and is_svg:
+                aspect_ratio = f"{dimensions.width:g} / {dimensions.height:g}"
+        if path is not None and self.assets is not None:
+            try:
+                copy = self.assets.add(path)
+            except OSError as error:
+                self.document.reporter.warning(
+                    f'Cannot copy image "{node["uri"]}" to the assets '
+                    f"directory: {error}",
+                    base_node=node,
+                )
+            else:
+                if not is_svg:
+                    # The alternative text defaults to the (original) URI.
+                    node.setdefault("alt", node["uri"])
+                node["uri"] = utils.relative_path(self.settings._destination, copy)
+                self.record_output(copy)
+        if is_svg:
             # SVGs need to be embedded using an object tag to be displayed
             # correctly, when external fonts are referenced in the svg file.
             attributes = {
@@ -626,11 +1431,24 @@ class LDTranslator(html5_polyglot.HTMLTranslator):
                 attributes["width"] = node.attributes["width"]
             if "height" in node.attributes:
                 attributes["height"] = node.attributes["height"]
+            if aspect_ratio is not None:
+                attributes["style"] = f"aspect-ratio: {aspect_ratio};"
             self.body.append(self.starttag(node, "object", **attributes))
         else:
             html5_polyglot.HTMLTranslator.visit_image(self, node)
 
+    def read_small_svg(self, path):
+        """The content of the SVG if it is small enough to be embedded."""
+        try:
+            if os.path.getsize(path) > self.ld_inline_svg_max:
+                return None
+            return Path(path).read_text(encoding="utf-8")
+        except (OSError, UnicodeError):
+            return None
+
     def depart_image(self, node):
+        if id(node) in self.inlined_svgs:
+            return
         if node.attributes["uri"].endswith(".svg"):
             self.body.append("</object>")
         else:
@@ -657,24 +1475,51 @@ class LDTranslator(html5_polyglot.HTMLTranslator):
 
         self.section_count += 1
         self.section_level += 1
+        if self.section_level == 1:
+            self.slide_count += 1
+            self.start_of_topic = len(self.body)
+        if self.section_level == 1 and self.search_index is not None:
+            title = node[0].astext() if isinstance(node[0], nodes.title) else ""
+            self.search_index.add_topic(node["ids"][0], title, [node])
         if self.section_level > 1:
             # dummy for matching div's
             self.body.append(self.starttag(node, "div", CLASS="section"))
         else:
-            if "hide-slide" in node.attributes["classes"]:
-                self.start_of_slide_to_hide = len(self.body)
-            else:
-                self.body.append(self.starttag(node, "ld-topic"))
+            self.body.append(self.starttag(node, "ld-topic"))
 
     def depart_section(self, node):
         self.section_level -= 1
-        if self.start_of_slide_to_hide is not None:
-            del self.body[self.start_of_slide_to_hide :]
-            self.start_of_slide_to_hide = None
-        elif self.section_level >= 1:
+        if self.section_level >= 1:
             self.body.append("</div>\n")
         else:
             self.body.append("</ld-topic>\n")
+            if (
+                self.topics_directory is not None
+                and self.slide_count > self.ld_lazy_topics
+            ):
+                self.defer_topic(node)
+            self.flush_topics()
+
+    def defer_topic(self, node):
+        """Moves the (just translated) slide to the topics which are loaded
+        on demand; the slide is replaced by an empty ld-topic element which
+        references the file."""
+        topic_id = node["ids"][0]
+        file_name = topic_id + ".html"
+        source = os.path.basename(self.topics_directory) + "/" + file_name
+        self.lazy_topics.append((file_name, self.body[self.start_of_topic :]))
+        del self.body[self.start_of_topic :]
+        self.start_of_topic = None
+        title = node[0].astext() if isinstance(node[0], nodes.title) else ""
+        self.topics_index.append((topic_id, title, file_name))
+        self.body.append(
+            self.starttag(
+                {"ids": [topic_id], "classes": node["classes"]},
+                "ld-topic",
+                **{"data-ld-src": source},
+            )
+            + "</ld-topic>\n"
+        )
 
     def visit_subscript(self, node):
         # self.body.append(self.starttag(node, "sub"))
@@ -735,61 +1580,66 @@ class LDTranslator(html5_polyglot.HTMLTranslator):
     def depart_scrollable(self, node):
         self.body.append("</ld-scrollable>")
 
-    def visit_presenter_note(self, node):
-        self.presenter_note_count += 1
-
-        if self.master_password is None:
-            raise Exception("presenter notes require a master password")
+    def structure_error(self, node, message):
+        """Stops the translation of a document which violates a structural
+        rule. The rules are checked by the `ValidateStructure` transform;
+        this is only reached if the translation was not halted (e.g., if
+        `--halt` is set above "severe")."""
+        error = self.document.reporter.system_message(
+            4, message, base_node=located(node)
+        )
+        raise utils.SystemMessage(error, 4)
 
+    def visit_presenter_note(self, node):
         if self.start_of_presenter_note is not None:
-            raise Exception(
-                "presenter notes cannot be nested"
-            )  # TODO move to parsing phase!
+            self.structure_error(node, "presenter notes cannot be nested")
+        if self.master_password is None and not self.ld_clear:
+            self.structure_error(node, "presenter notes require a master password")
+        self.presenter_note_count += 1
+        if self.ld_clear:
+            self.body.append(
+                self.starttag(
+                    node,
+                    "ld-presenter-note",
+                    **{"class": " ".join(node.attributes["classes"])},
+                )
+            )
+            return
 
         attributes = {
             "class": " ".join(node.attributes["classes"]),
             "encrypted": "",  # ENCRYPTED is a boolean attribute
         }
+        if self.ld_encrypted_sidecar is not None:
+            attributes["data-encrypted-ref"] = self.presenter_note_sidecar_key()
         self.body.append(self.starttag(node, "ld-presenter-note", **attributes))
         self.start_of_presenter_note = len(self.body)
 
+    def presenter_note_sidecar_key(self):
+        return f"presenter-note-{self.presenter_note_count}"
+
     def depart_presenter_note(self, node):
+        if self.ld_clear:
+            self.body.append("</ld-presenter-note>\n")
+            return
         end_of_presenter_note = len(self.body)
         presenter_note_body = "".join(
             self.body[self.start_of_presenter_note : end_of_presenter_note + 1]
         )
-        presenter_note_hash = hashlib.sha512(
-            presenter_note_body.encode("utf-8")
-        ).digest()
         # 2.
         del self.body[self.start_of_presenter_note :]
         self.start_of_presenter_note = None
-        # 3.
-        pwd = self.master_password.encode("utf-8")
-        # We really want a stable salt and iv to avoid that re-running
-        # rst2ld changes the output when the password is the same
-        # and the content hasn't changed!
-        salt = presenter_note_hash[:32]
-        iv = presenter_note_hash[32:44]  # get_random_bytes(12)
-        aesKey = PBKDF2(
-            pwd, salt, dkLen=32, count=ldPBKDF2IterationCount, hmac_hash_module=SHA256
-        )
-        cipher = AES.new(aesKey, AES.MODE_GCM, nonce=iv, mac_len=16)
-        (ciphertext, tag) = cipher.encrypt_and_digest(
-            presenter_note_body.encode("utf-8")
-        )
-        # 4.
+        # 3. + 4.
+        # The salt and iv are derived from the content (see encryptAESGCM);
+        # re-running rst2ld does not change the output when the password is
+        # the same and the content hasn't changed!
         self.body.append(
-            base64.b64encode(str(ldPBKDF2IterationCount).encode("utf-8")).decode(
-                "utf-8"
+            self.encrypt(
+                self.master_password,
+                presenter_note_body,
+                sidecar_key=self.presenter_note_sidecar_key(),
             )
         )
-        self.body.append(":")
-        self.body.append(base64.b64encode(salt).decode("utf-8"))
-        self.body.append(":")
-        self.body.append(base64.b64encode(iv).decode("utf-8"))
-        self.body.append(":")
-        self.body.append(base64.b64encode(ciphertext + tag).decode("utf-8"))
         self.body.append("</ld-presenter-note>\n")
 
     # --------------------------------------------------------------------------
@@ -801,14 +1651,14 @@ class LDTranslator(html5_polyglot.HTMLTranslator):
 
     def visit_exercise(self, node):
         if self.start_of_exercise is not None:
-            raise Exception("exercises cannot be nested")  # TODO move to parsing phase!
-
+            self.structure_error(node, "exercises cannot be nested")
         self.exercise_count += 1
         title = ""
         if "title" in node.attributes:
             title = " - " + node.attributes["title"]
         title = str(self.exercise_count) + title
         self.current_exercise_name = title
+        self.current_exercise_identifier = self.exercise_identifier(node)
         self.start_of_exercise = len(self.body)
         attributes = {
             "class": " ".join(node.attributes["classes"]),
@@ -818,22 +1668,46 @@ class LDTranslator(html5_polyglot.HTMLTranslator):
         }
         self.body.append(self.starttag(node, "div", **attributes))
 
+    def exercise_identifier(self, node):
+        """A stable identifier of the exercise which - unlike the exercise's
+        number - does not change when exercises are added or removed in
+        front of it."""
+        title = node.attributes.get("title")
+        if title is None:
+            return f"#{self.exercise_count}"
+        count = self.exercise_title_counts.get(title, 0) + 1
+        self.exercise_title_counts[title] = count
+        return f"{title}#{count}"
+
+    def solution_password(self):
+        if self.document.settings.ld_derive_passwords and self.master_password:
+            document_name = os.path.basename(self.document["source"])
+            return derivePassword(
+                self.master_password,
+                f"{document_name}:{self.current_exercise_identifier}",
+            )
+        else:
+            return generatePassword()
+
     def depart_exercise(self, node):
         self.start_of_exercise = None
         self.current_exercise_name = None
+        self.current_exercise_identifier = None
         self.body.append("</div>\n")
 
     def visit_solution(self, node):
         if self.start_of_exercise is None:
-            raise Exception(
-                "solutions must be nested in exercises"
-            )  # TODO move to parsing phase!
+            self.structure_error(node, "solutions must be nested in exercises")
         if self.start_of_solution is not None:
-            raise Exception("solutions cannot be nested")  # TODO move to parsing phase!
+            self.structure_error(node, "solutions cannot be nested")
         if self.current_exercise_name in self.exercises_passwords_titles:
-            raise Exception(
-                "one exercise can only have one solution"
-            )  # TODO move to parsing phase!
+            self.structure_error(node, "one exercise can only have one solution")
+        if self.ld_clear:
+            attributes = {"class": " ".join(node.attributes["classes"])}
+            self.body.append(self.starttag(node, "div", **attributes))
+            return
+        if "pwd" not in node.attributes:
+            node.attributes["pwd"] = self.solution_password()
 
         self.exercises_passwords.append(
             (self.current_exercise_name, node.attributes["pwd"])
@@ -845,47 +1719,41 @@ class LDTranslator(html5_polyglot.HTMLTranslator):
             "class": " ".join(node.attributes["classes"]),
             "data-encrypted": "true",  # ENCRYPTED is a boolean attribute
         }
+        if self.ld_encrypted_sidecar is not None:
+            attributes["data-encrypted-ref"] = self.solution_sidecar_key()
         self.body.append(self.starttag(node, "div", **attributes))
         self.start_of_solution = len(self.body)
 
+    def solution_sidecar_key(self):
+        return f"solution-{self.exercise_count}"
+
     def depart_solution(self, node):
         # Idea:
         # 1. Extract the solution
         # 2. Remove the "generated HTML of the solution" from the body
         # 3. Encrypt the solution using AES-GCM
         # 4. Add the encrypted solution to the body (base64 encoded)
+        if self.ld_clear:
+            self.body.append("</div>\n")
+            return
 
         # 1.
         end_of_solution = len(self.body)
         solution_body = "".join(self.body[self.start_of_solution : end_of_solution + 1])
-        solution_hash = hashlib.sha512(solution_body.encode("utf-8")).digest()
         # 2.
         del self.body[self.start_of_solution :]
         self.start_of_solution = None
-        # 3.
-        pwd = node.attributes["pwd"].encode("utf-8")
-        # We really want a stable salt and iv to avoid that re-running
-        # rst2ld changes the output when the password is the same
-        # and the content hasn't changed!
-        salt = solution_hash[:32]
-        iv = solution_hash[32:44]  # get_random_bytes(12)
-        aesKey = PBKDF2(
-            pwd, salt, dkLen=32, count=ldPBKDF2IterationCount, hmac_hash_module=SHA256
-        )
-        cipher = AES.new(aesKey, AES.MODE_GCM, nonce=iv, mac_len=16)
-        (ciphertext, tag) = cipher.encrypt_and_digest(solution_body.encode("utf-8"))
-        # 4.
+        # 3. + 4.
+        # The salt and iv are derived from the content (see encryptAESGCM);
+        # re-running rst2ld does not change the output when the password is
+        # the same and the content hasn't changed!
         self.body.append(
-            base64.b64encode(str(ldPBKDF2IterationCount).encode("utf-8")).decode(
-                "utf-8"
+            self.encrypt(
+                node.attributes["pwd"],
+                solution_body,
+                sidecar_key=self.solution_sidecar_key(),
             )
         )
-        self.body.append(":")
-        self.body.append(base64.b64encode(salt).decode("utf-8"))
-        self.body.append(":")
-        self.body.append(base64.b64encode(iv).decode("utf-8"))
-        self.body.append(":")
-        self.body.append(base64.b64encode(ciphertext + tag).decode("utf-8"))
         self.body.append("</div>\n")
 
 
@@ -908,11 +1776,54 @@ directives.register_directive("solution", Solution)
 directives.register_directive("source", Source)
 
 
-# Imported for the "side effects" of registering the directives
-import lddocutils.ldwriter.lddirectives.admonitions
-import lddocutils.ldwriter.lddirectives.code
-import lddocutils.ldwriter.lddirectives.decks
-import lddocutils.ldwriter.lddirectives.global_information
-import lddocutils.ldwriter.lddirectives.grids
-import lddocutils.ldwriter.lddirectives.popover
-import lddocutils.ldwriter.lddirectives.stories
+#
+# Directives which are implemented in the lddirectives modules. A module is
+# only imported - for the "side effects" of registering its directives, nodes
+# and visitor methods - when one of its directives is used for the first time.
+ldLazyDirectives = {
+    **dict.fromkeys(
+        [
+            "definition",
+            "example",
+            "background",
+            "proof",
+            "theorem",
+            "lemma",
+            "conclusion",
+            "observation",
+            "remark",
+            "summary",
+            "legend",
+            "repetition",
+            "question",
+            "answer",
+            "remember",
+            "deprecated",
+            "assessment",
+        ],
+        "admonitions",
+    ),
+    # Extends docutils' code directive.
+    **dict.fromkeys(["code", "code-block", "sourcecode"], "code"),
+    **dict.fromkeys(["deck", "card"], "decks"),
+    "global-information": "global_information",
+    **dict.fromkeys(["grid", "cell"], "grids"),
+    "popover": "popover",
+    "story": "stories",
+}
+
+_docutils_directive = directives.directive
+
+
+def directive(directive_name, language_module, document):
+    """Wraps docutils' directive lookup to import the lddirectives module
+    implementing the directive (if any) first."""
+    name = directive_name.lower()
+    name = getattr(language_module, "directives", {}).get(name, name)
+    module_name = ldLazyDirectives.get(name)
+    if module_name is not None:
+        importlib.import_module("lddocutils.ldwriter.lddirectives." + module_name)
+    return _docutils_directive(directive_name, language_module, document)
+
+
+directives.directive = directive
@@ -0,0 +1,56 @@
+"""
+Asset pipeline (see `--ld-assets-dir`): the local images referenced by a
+document are copied to the assets directory; the names of the copies
+contain the hash of their content. Hence, the assets can be cached by
+browsers (and proxies) for an unlimited time; a changed image results in
+a new file and, therefore, in a new URI.
+"""
+
+import hashlib
+import os
+import shutil
+
+
+class Assets:
+    def __init__(self, directory):
+        self.directory = directory
+        # The copies of the files (path -> path of the copy).
+        self.copies = {}
+
+    def add(self, path):
+        """Copies the file to the assets directory (unless a copy with the
+        same content exists) and returns the path of the copy."""
+        path = os.fspath(path)
+        copy = self.copies.get(path)
+        if copy is not None:
+            return copy
+        with open(path, "rb") as file:
+            digest = hashlib.file_digest(file, "sha256").hexdigest()
+        copy = self.asset_path(os.path.basename(path), digest)
+        if not os.path.exists(copy):
+            os.makedirs(self.directory, exist_ok=True)
+            # Worker processes (see --batch) may write the same asset.
+            temporary = f"{copy}.{os.getpid()}.tmp"
+            shutil.copyfile(path, temporary)
+            os.replace(temporary, copy)
+        self.copies[path] = copy
+        return copy
+
+    def add_content(self, name, content):
+        """Stores the content (a string) as an asset; returns its path.
+
+        Documents which share the assets directory also share identical
+        content (e.g., the same global SVG definitions)."""
+        data = content.encode("utf-8")
+        path = self.asset_path(name, hashlib.sha256(data).hexdigest())
+        if not os.path.exists(path):
+            os.makedirs(self.directory, exist_ok=True)
+            temporary = f"{path}.{os.getpid()}.tmp"
+            with open(temporary, "wb") as file:
+                file.write(data)
+            os.replace(temporary, path)
+        return path
+
+    def asset_path(self, name, digest):
+        (stem, suffix) = os.path.splitext(name)
+        return os.path.join(self.directory, f"{stem}.{digest[:16]}{suffix}")
@@ -0,0 +1,46 @@
+"""
+Backends for the (expensive) PBKDF2-HMAC-SHA256 key derivation.
+
+- hashlib: uses OpenSSL and releases the GIL; i.e., the derivations scale
+  when using multiple threads.
+- pycryptodome: holds the GIL; i.e., multiple processes are required to
+  scale the derivations.
+
+Both backends compute the same keys. To measure the number of key
+derivations per second on the build host, run:
+
+    python3 -m lddocutils.ldwriter.crypto_calibration
+"""
+
+import hashlib
+
+
+def pbkdf2_hashlib(pwd: bytes, salt: bytes, iterationCount: int) -> bytes:
+    return hashlib.pbkdf2_hmac("sha256", pwd, salt, iterationCount, dklen=32)
+
+
+def pbkdf2_pycryptodome(pwd: bytes, salt: bytes, iterationCount: int) -> bytes:
+    from Crypto.Hash import SHA256
+    from Crypto.Protocol.KDF import PBKDF2
+
+    return PBKDF2(pwd, salt, dkLen=32, count=iterationCount, hmac_hash_module=SHA256)
+
+
+ldKDFBackends = {
+    "hashlib": pbkdf2_hashlib,
+    "pycryptodome": pbkdf2_pycryptodome,
+}
+
+# The backends which release the GIL and which can therefore be used with
+# a thread pool.
+ldGILFreeKDFBackends = {"hashlib"}
+
+
+def resolve_backend(name):
+    """Returns the name of the backend; "auto" is hashlib (OpenSSL), which
+    is always available."""
+    return "hashlib" if name == "auto" else name
+
+
+def pbkdf2(pwd: bytes, salt: bytes, iterationCount: int, backend="auto") -> bytes:
+    return ldKDFBackends[resolve_backend(backend)](pwd, salt, iterationCount)
@@ -0,0 +1,73 @@
+"""
+Measures the number of PBKDF2 key derivations per second of the available
+crypto backends on the build host; use the results to choose the crypto
+backend (`--ld-crypto-backend`), the number of jobs (`--ld-jobs`) and the
+iteration count.
+
+    python3 -m lddocutils.ldwriter.crypto_calibration [--jobs N]
+
+Like the translator (see `LDTranslator.map`), the derivations are run using
+threads if the backend releases the GIL and using processes otherwise.
+"""
+
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from lddocutils.ldwriter.crypto_backends import ldGILFreeKDFBackends, ldKDFBackends
+from lddocutils.ldwriter.encryption import ldPBKDF2IterationCount
+
+
+def derive(backend, salt, iterationCount):
+    return ldKDFBackends[backend](b"password", salt, iterationCount)
+
+
+def calibrate(backend, iterationCount, seconds=2.0, jobs=1):
+    """Returns the number of key derivations per second."""
+    salt = os.urandom(32)
+    if jobs == 1:
+        count = 0
+        start = time.perf_counter()
+        while (elapsed := time.perf_counter() - start) < seconds:
+            derive(backend, salt, iterationCount)
+            count += 1
+        return count / elapsed
+
+    if backend in ldGILFreeKDFBackends:
+        Executor = ThreadPoolExecutor
+    else:
+        Executor = ProcessPoolExecutor
+    arguments = ([backend] * jobs, [salt] * jobs, [iterationCount] * jobs)
+    with Executor(jobs) as executor:
+        list(executor.map(derive, *arguments))  # starts the workers
+        count = 0
+        start = time.perf_counter()
+        while (elapsed := time.perf_counter() - start) < seconds:
+            list(executor.map(derive, *arguments))
+            count += jobs
+    return count / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Measures the PBKDF2 key derivations per second of the "
+        "available crypto backends."
+    )
+    parser.add_argument("--iterations", type=int, default=ldPBKDF2IterationCount)
+    parser.add_argument("--seconds", type=float, default=2.0)
+    parser.add_argument("--jobs", type=int, default=os.cpu_count())
+    args = parser.parse_args()
+
+    print(f"PBKDF2-HMAC-SHA256 with {args.iterations} iterations:")
+    for backend in ldKDFBackends:
+        for jobs in sorted({1, args.jobs}):
+            rate = calibrate(backend, args.iterations, args.seconds, jobs)
+            print(
+                f"  {backend:<14} {jobs:>3} job(s): "
+                f"{rate:8.1f} derivations/s ({1000 / rate:7.1f} ms/derivation)"
+            )
+
+
+if __name__ == "__main__":
+    main()
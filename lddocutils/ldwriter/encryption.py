@@ -0,0 +1,124 @@
+"""
+Encryption of solutions, presenter notes and the passwords of the exercises.
+
+The encrypted content is stored as: `iterations:salt:iv:ciphertext`; all
+four parts are base64 encoded. The first part is the iteration count used
+by PBKDF2 and - optionally - additional parameters separated by ";".
+
+Two schemes are supported:
+
+- Per-block keys (default): the AES key of each block is derived from the
+  password using PBKDF2 and the salt of the block.
+- Per-document keys: one key encryption key (KEK) is derived per password
+  and document using PBKDF2; the AES key of each block is then derived from
+  the KEK using HKDF and the salt of the block. In this case, the first
+  part is: `iterations;kdf=hkdf-sha256;kek-salt=<base64 encoded salt>`.
+  Hence, rst2ld as well as LectureDoc2 only have to run PBKDF2 once per
+  password.
+
+In both cases, the salt and the iv are derived from the plaintext to
+ensure that the output does not change when the content does not change.
+
+Optionally, the plaintext is compressed (raw deflate; browsers can inflate
+it using `DecompressionStream("deflate-raw")`) before it is encrypted; in
+this case, the first part additionally contains the parameter `deflate`;
+e.g., `100000;deflate`.
+
+In draft mode, the content is not encrypted at all: the first part is
+`0;draft`, the salt and the iv are empty and the last part is the base64
+encoded plaintext.
+"""
+
+import base64
+import hashlib
+import zlib
+
+# pycryptodome is only imported when the first block is encrypted; i.e., it
+# is not loaded for documents without encrypted content.
+from lddocutils.ldwriter.crypto_backends import pbkdf2
+
+ldPBKDF2IterationCount = 100000
+
+ldHKDFInfo = b"LectureDoc2 block key"
+
+
+def b64(data):
+    return base64.b64encode(data).decode("utf-8")
+
+
+def envelope(header, salt, iv, ciphertext):
+    return (
+        b64(header.encode("utf-8"))
+        + ":"
+        + b64(salt)
+        + ":"
+        + b64(iv)
+        + ":"
+        + b64(ciphertext)
+    )
+
+
+def salt_and_iv(plaintext):
+    base_hash = hashlib.sha512(plaintext.encode("utf-8")).digest()
+    salt = base_hash[:32]  # get_random_bytes(32)
+    iv = base_hash[32:44]  # get_random_bytes(12)
+    return (salt, iv)
+
+
+def deflate(data):
+    compressor = zlib.compressobj(9, zlib.DEFLATED, -15)  # raw deflate
+    return compressor.compress(data) + compressor.flush()
+
+
+def aesGCM(key, iv, plaintext, compress=False):
+    from Crypto.Cipher import AES
+
+    data = plaintext.encode("utf-8")
+    if compress:
+        data = deflate(data)
+    cipher = AES.new(key, AES.MODE_GCM, nonce=iv, mac_len=16)
+    (ciphertext, tag) = cipher.encrypt_and_digest(data)
+    return ciphertext + tag
+
+
+def encryptAESGCM(
+    pwd,
+    plaintext,
+    iterationCount=ldPBKDF2IterationCount,
+    backend="auto",
+    compress=False,
+):
+    # The following encryption scheme is compatible with the one used by LectureDoc2.
+    # Additionally, we want to encrypt the content in the same way when we
+    # didn't change the content.
+    (salt, iv) = salt_and_iv(plaintext)
+    aesKey = pbkdf2(pwd.encode("utf-8"), salt, iterationCount, backend)
+    header = str(iterationCount)
+    if compress:
+        header += ";deflate"
+    return envelope(header, salt, iv, aesGCM(aesKey, iv, plaintext, compress))
+
+
+def kekSalt(document_name):
+    """The salt used to derive the key encryption keys of a document."""
+    return hashlib.sha256(("LectureDoc2 KEK:" + document_name).encode("utf-8")).digest()
+
+
+def deriveKEK(pwd, salt, iterationCount=ldPBKDF2IterationCount, backend="auto"):
+    return pbkdf2(pwd.encode("utf-8"), salt, iterationCount, backend)
+
+
+def encryptAESGCMWithKEK(kek, kekSalt, plaintext, iterationCount, compress=False):
+    from Crypto.Hash import SHA256
+    from Crypto.Protocol.KDF import HKDF
+
+    (salt, iv) = salt_and_iv(plaintext)
+    aesKey = HKDF(kek, 32, salt, SHA256, context=ldHKDFInfo)
+    header = f"{iterationCount};kdf=hkdf-sha256;kek-salt={b64(kekSalt)}"
+    if compress:
+        header += ";deflate"
+    return envelope(header, salt, iv, aesGCM(aesKey, iv, plaintext, compress))
+
+
+def draftEnvelope(plaintext):
+    return envelope("0;draft", b"", b"", plaintext.encode("utf-8"))
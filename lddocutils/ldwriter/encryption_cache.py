@@ -0,0 +1,110 @@
+"""
+Persistent cache for encrypted solutions and presenter notes.
+
+Salt and IV of an encrypted block are derived from the plaintext. Hence,
+the encrypted representation of a block only depends on the plaintext,
+the password and the number of PBKDF2 iterations. The (expensive)
+encryption can therefore be skipped when the same block was already
+encrypted by a previous run of rst2ld.
+
+The cache is stored in an SQLite database in the configured cache
+directory. If the cache grew beyond its size limit, the least recently
+used entries are evicted when the cache is closed (i.e., once per run).
+
+The cache's keys are (fast) hashes of the password and the plaintext.
+Hence, the cache directory must not be published!
+"""
+
+import hashlib
+import os
+import sqlite3
+import time
+
+
+class EncryptionCache:
+
+    file_name = "encryption-cache.sqlite"
+
+    def __init__(self, directory, max_size):
+        """Opens (or creates) the cache in the given directory.
+
+        `max_size` is the maximum size (in bytes) of all cached encrypted
+        blocks.
+        """
+        os.makedirs(directory, exist_ok=True)
+        self.max_size = max_size
+        self.connection = sqlite3.connect(
+            os.path.join(directory, self.file_name), timeout=30
+        )
+        self.connection.execute(
+            """CREATE TABLE IF NOT EXISTS encrypted_blocks (
+                    key TEXT PRIMARY KEY,
+                    envelope TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    last_used REAL NOT NULL
+                )"""
+        )
+        self.connection.execute(
+            """CREATE INDEX IF NOT EXISTS encrypted_blocks_last_used
+                    ON encrypted_blocks (last_used)"""
+        )
+        self.connection.commit()
+
+    @staticmethod
+    def key(pwd, plaintext, parameters):
+        """`parameters` is a tuple (e.g., the iteration count) that - in
+        addition to the password and plaintext - determines the encrypted
+        representation."""
+        h = hashlib.sha256()
+        h.update(hashlib.sha512(plaintext.encode("utf-8")).digest())
+        h.update(hashlib.sha256(pwd.encode("utf-8")).digest())
+        h.update(repr(parameters).encode("utf-8"))
+        return h.hexdigest()
+
+    def get(self, pwd, plaintext, parameters):
+        """Returns the cached envelope (`iterations:salt:iv:ciphertext`) or None."""
+        key = self.key(pwd, plaintext, parameters)
+        row = self.connection.execute(
+            "SELECT envelope FROM encrypted_blocks WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        self.connection.execute(
+            "UPDATE encrypted_blocks SET last_used = ? WHERE key = ?",
+            (time.time(), key),
+        )
+        self.connection.commit()
+        return row[0]
+
+    def put(self, pwd, plaintext, parameters, envelope):
+        key = self.key(pwd, plaintext, parameters)
+        self.connection.execute(
+            "INSERT OR REPLACE INTO encrypted_blocks VALUES (?, ?, ?, ?)",
+            (key, envelope, len(envelope), time.time()),
+        )
+        self.connection.commit()
+
+    def evict(self):
+        """Removes the least recently used entries until the cache fits."""
+        (size,) = self.connection.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM encrypted_blocks"
+        ).fetchone()
+        if size <= self.max_size:
+            return
+        rows = self.connection.execute(
+            "SELECT key, size FROM encrypted_blocks ORDER BY last_used"
+        ).fetchall()
+        evicted = []
+        for key, entry_size in rows:
+            if size <= self.max_size:
+                break
+            evicted.append((key,))
+            size -= entry_size
+        self.connection.executemany(
+            "DELETE FROM encrypted_blocks WHERE key = ?", evicted
+        )
+
+    def close(self):
+        self.evict()
+        self.connection.commit()
+        self.connection.close()
@@ -0,0 +1,210 @@
+"""
+Intrinsic dimensions of images (see `--ld-image-dimensions`).
+
+The dimensions are read from the headers of PNG, JPEG, WebP and GIF images
+and from the root element of SVG images (its width and height or - if
+they are not absolute - its viewBox); the images are not decoded. If only
+the viewBox of an SVG is known, only the aspect ratio of the image is
+known.
+
+The dimensions are cached per image (path, modification time and size);
+if a cache directory is given, the cache is persisted in that directory.
+"""
+
+import collections
+import json
+import os
+import re
+import struct
+import xml.etree.ElementTree as ET
+
+# `intrinsic` is False if only the aspect ratio is known.
+Dimensions = collections.namedtuple("Dimensions", ["width", "height", "intrinsic"])
+
+ldSVGLength = re.compile(r"^\s*(\d+(?:\.\d+)?)\s*(px)?\s*$")
+
+# The JPEG markers of the "start of frame" segments.
+ldJPEGStartOfFrame = set(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+
+
+def png_dimensions(file, header):
+    if header[12:16] != b"IHDR":
+        return None
+    (width, height) = struct.unpack(">II", header[16:24])
+    return Dimensions(width, height, True)
+
+
+def gif_dimensions(file, header):
+    (width, height) = struct.unpack("<HH", header[6:10])
+    return Dimensions(width, height, True)
+
+
+def webp_dimensions(file, header):
+    chunk = header[12:16]
+    if chunk == b"VP8 ":
+        (width, height) = struct.unpack("<HH", header[26:30])
+        return Dimensions(width & 0x3FFF, height & 0x3FFF, True)
+    if chunk == b"VP8L":
+        b = header[21:25]
+        width = 1 + (((b[1] & 0x3F) << 8) | b[0])
+        height = 1 + (((b[3] & 0x0F) << 10) | (b[2] << 2) | ((b[1] & 0xC0) >> 6))
+        return Dimensions(width, height, True)
+    if chunk == b"VP8X":
+        width = 1 + int.from_bytes(header[24:27], "little")
+        height = 1 + int.from_bytes(header[27:30], "little")
+        return Dimensions(width, height, True)
+    return None
+
+
+def exif_orientation(segment):
+    """The orientation stored in the EXIF data (APP1 segment) or 1."""
+    if segment[:6] != b"Exif\x00\x00":
+        return 1
+    tiff = segment[6:]
+    byte_order = {b"II": "<", b"MM": ">"}.get(tiff[:2])
+    if byte_order is None:
+        return 1
+    (ifd_offset,) = struct.unpack(byte_order + "I", tiff[4:8])
+    (count,) = struct.unpack(byte_order + "H", tiff[ifd_offset : ifd_offset + 2])
+    for i in range(count):
+        entry = tiff[ifd_offset + 2 + i * 12 : ifd_offset + 14 + i * 12]
+        if len(entry) < 12:
+            break
+        (tag, _, _, value) = struct.unpack(byte_order + "HHIH", entry[:10])
+        if tag == 0x0112:
+            return value
+    return 1
+
+
+def jpeg_dimensions(file, header):
+    """Reads the segments up to the (first) "start of frame" segment; the
+    dimensions are swapped if the image is rotated (EXIF orientation)."""
+    file.seek(2)
+    orientation = 1
+    while True:
+        marker = file.read(2)
+        if len(marker) < 2 or marker[0] != 0xFF:
+            return None
+        if marker[1] in (0xD8, 0x01) or 0xD0 <= marker[1] <= 0xD7:
+            continue  # markers without segments
+        length = file.read(2)
+        if len(length) < 2:
+            return None
+        (length,) = struct.unpack(">H", length)
+        if marker[1] in ldJPEGStartOfFrame:
+            segment = file.read(5)
+            if len(segment) < 5:
+                return None
+            (height, width) = struct.unpack(">HH", segment[1:5])
+            if orientation >= 5:
+                (width, height) = (height, width)
+            return Dimensions(width, height, True)
+        if marker[1] == 0xE1 and orientation == 1:
+            orientation = exif_orientation(file.read(length - 2))
+        else:
+            file.seek(length - 2, os.SEEK_CUR)
+
+
+def svg_dimensions(file, header):
+    file.seek(0)
+    try:
+        for _, root in ET.iterparse(file, events=("start",)):
+            break
+        else:
+            return None
+    except ET.ParseError:
+        return None
+    width = ldSVGLength.match(root.get("width", ""))
+    height = ldSVGLength.match(root.get("height", ""))
+    if width and height:
+        return Dimensions(float(width[1]), float(height[1]), True)
+    view_box = root.get("viewBox", "").replace(",", " ").split()
+    if len(view_box) == 4:
+        try:
+            (width, height) = (float(view_box[2]), float(view_box[3]))
+        except ValueError:
+            return None
+        if width > 0 and height > 0:
+            return Dimensions(width, height, False)
+    return None
+
+
+def read_dimensions(path):
+    """Reads the dimensions of the image; None if the format is not
+    supported or the image cannot be read."""
+    try:
+        with open(path, "rb") as file:
+            header = file.read(32)
+            if header.startswith(b"\x89PNG\r\n\x1a\n"):
+                return png_dimensions(file, header)
+            if header[:6] in (b"GIF87a", b"GIF89a"):
+                return gif_dimensions(file, header)
+            if header[:4] == b"RIFF" and header[8:12] == b"WEBP":
+                return webp_dimensions(file, header)
+            if header[:2] == b"\xff\xd8":
+                return jpeg_dimensions(file, header)
+            if str(path).endswith(".svg"):
+                return svg_dimensions(file, header)
+    except (OSError, struct.error):
+        pass
+    return None
+
+
+class ImageDimensions:
+
+    file_name = "image-dimensions.json"
+
+    def __init__(self, directory=None):
+        """`directory` is the directory in which the cache is persisted."""
+        self.path = None
+        self.entries = {}
+        self.modified = False
+        if directory is not None:
+            self.path = os.path.join(directory, self.file_name)
+            try:
+                with open(self.path) as file:
+                    self.entries = json.load(file)
+            except (OSError, ValueError):
+                pass
+
+    @staticmethod
+    def stamp(path):
+        stat = os.stat(path)
+        return [stat.st_mtime_ns, stat.st_size]
+
+    def get(self, path):
+        """The (cached) dimensions of the image or None."""
+        key = os.path.abspath(path)
+        try:
+            stamp = self.stamp(path)
+        except OSError:
+            return None
+        entry = self.entries.get(key)
+        if entry is not None and entry[:2] == stamp:
+            return Dimensions(*entry[2:]) if entry[2:] else None
+        dimensions = read_dimensions(path)
+        self.entries[key] = stamp + (list(dimensions) if dimensions else [])
+        self.modified = True
+        return dimensions
+
+    def prefetch(self, paths, jobs):
+        """Reads the dimensions of the images using up to `jobs` threads
+        (reading the headers is I/O bound)."""
+        paths = list(dict.fromkeys(paths))
+        if jobs > 1 and len(paths) > 1:
+            from concurrent.futures import ThreadPoolExecutor
+
+            with ThreadPoolExecutor(min(jobs, len(paths))) as executor:
+                list(executor.map(self.get, paths))
+        else:
+            for path in paths:
+                self.get(path)
+
+    def save(self):
+        if self.path is None or not self.modified:
+            return
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(self.path + ".tmp", "w") as file:
+            json.dump(self.entries, file)
+        os.replace(self.path + ".tmp", self.path)
+        self.modified = False
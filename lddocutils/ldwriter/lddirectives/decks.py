@@ -72,8 +72,8 @@ def depart_deck(self, node):
 
 
 def visit_card(self, node):
-    if len(self.card_count) == 0:
-        raise Exception("card directive must be nested in a deck directive")
+    if not self.card_count:
+        self.structure_error(node, "card directive must be nested in a deck directive")
     card_id = self.card_count.pop()
     if card_id > 0 and not node.attributes.get("not_incremental"):
         node.attributes["classes"] += ["incremental"]
@@ -0,0 +1,65 @@
+"""
+Search index of a LectureDoc2 document (see `--ld-search-index`).
+
+The index is an inverted index which maps the (lowercase) words of the
+document to the topics (i.e., the title slide and the slides) which contain
+them; it is built while the document is translated. Encrypted content
+(solutions and presenter notes) is not indexed. The JSON representation is:
+
+    {
+        "topics": [["<id of the ld-topic>", "<title>"], ...],
+        "terms": {"<word>": [<index of the topic>, ...], ...}
+    }
+"""
+
+import json
+import re
+
+from docutils import nodes
+
+ldWord = re.compile(r"\w{2,}")
+
+# Nodes whose text is not (visibly) part of the document.
+ldUnindexedNodes = {
+    "comment",
+    "raw",
+    "system_message",
+    "substitution_definition",
+    "meta",
+}
+
+
+class SearchIndex:
+    def __init__(self, skipped=()):
+        """`skipped` are the tag names of nodes which are not indexed
+        additionally (e.g., the encrypted solutions)."""
+        self.skipped = ldUnindexedNodes | set(skipped)
+        self.topics = []
+        self.terms = {}
+
+    def text(self, node):
+        if isinstance(node, nodes.Text):
+            yield node.astext()
+        elif node.tagname not in self.skipped:
+            for child in node.children:
+                yield from self.text(child)
+
+    def add_topic(self, topic_id, title, content):
+        """Indexes the text of the given nodes (`content`) as a topic."""
+        topic = len(self.topics)
+        self.topics.append([topic_id, title])
+        words = {
+            word
+            for node in content
+            for text in self.text(node)
+            for word in ldWord.findall(text.lower())
+        }
+        for word in words:
+            self.terms.setdefault(word, []).append(topic)
+
+    def to_json(self):
+        return json.dumps(
+            {"topics": self.topics, "terms": dict(sorted(self.terms.items()))},
+            ensure_ascii=False,
+            separators=(",", ":"),
+        )
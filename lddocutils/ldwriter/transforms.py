@@ -0,0 +1,140 @@
+"""
+Transforms which are applied to the doctree before it is translated by the
+LDTranslator.
+"""
+
+from docutils import nodes
+from docutils.transforms import Transform
+
+
+class HideSlides(Transform):
+    """Removes the top-level sections (i.e., the slides) with the class
+    "hide-slide"; hidden slides are not translated at all. Hence, the
+    solutions and presenter notes they contain are not encrypted and their
+    exercises are neither numbered nor added to the passwords file.
+    """
+
+    # After the references (to the hidden slides) were resolved.
+    default_priority = 790
+
+    def apply(self):
+        for section in list(self.document.findall(nodes.section)):
+            if section.parent is self.document and "hide-slide" in section["classes"]:
+                section.parent.remove(section)
+
+
+# The variants of a document (see `--ld-variant`) and the variants whose
+# solutions and presenter notes are not encrypted.
+ldVariants = ["slides", "exercise-sheet", "solutions", "presenter-notes"]
+ldClearVariants = {"solutions", "presenter-notes"}
+
+
+class SelectVariant(Transform):
+    """Removes the parts of the document which are not part of the selected
+    variant (`--ld-variant`):
+
+    - "exercise-sheet": the slides without exercises, the solutions and the
+      presenter notes,
+    - "solutions": the slides without exercises and the presenter notes,
+    - "presenter-notes": all content of the slides except of their titles
+      and presenter notes; slides without presenter notes are removed.
+    """
+
+    # After the hidden slides were removed.
+    default_priority = 795
+
+    def apply(self):
+        variant = self.document.settings.ld_variant
+        if variant == "slides":
+            return
+        slides = [
+            node for node in self.document.children if isinstance(node, nodes.section)
+        ]
+        for slide in slides:
+            notes = list(slide.findall(lambda n: n.tagname == "presenter_note"))
+            if variant == "presenter-notes":
+                if not notes:
+                    self.document.remove(slide)
+                    continue
+                kept = [slide[0]] if isinstance(slide[0], nodes.title) else []
+                slide[:] = kept + notes
+                continue
+
+            removed = notes
+            if variant == "exercise-sheet":
+                removed += slide.findall(lambda n: n.tagname == "solution")
+            for node in removed:
+                node.parent.remove(node)
+            if not any(slide.findall(lambda n: n.tagname == "exercise")):
+                self.document.remove(slide)
+
+
+def located(node):
+    """The node or - if the node has no line number (e.g., because it was
+    created by one of our directives) - its first descendant which has one."""
+    if node.line is None:
+        for descendant in node.findall(nodes.Element, include_self=False):
+            if descendant.line is not None:
+                return descendant
+    return node
+
+
+def has_ancestor(node, tagname):
+    parent = node.parent
+    while parent is not None:
+        if parent.tagname == tagname:
+            return True
+        parent = parent.parent
+    return False
+
+
+class ValidateStructure(Transform):
+    """Checks the structural rules of LectureDoc2 documents; each violation
+    is reported as an error. A document which violates a rule cannot be
+    translated; hence, a severe error is reported afterwards.
+
+    The nodes are identified by their tag names because the lddirectives
+    modules (e.g., the one defining decks and cards) are loaded lazily.
+    """
+
+    default_priority = 100
+
+    def apply(self):
+        violations = list(self.violations())
+        for node, message in violations:
+            self.document.reporter.error(message, base_node=located(node))
+        if violations:
+            self.document.reporter.severe(
+                f"the document violates {len(violations)} structural rule(s) "
+                "of LectureDoc2"
+            )
+
+    def violations(self):
+        """Yields the violating nodes and the violated rules."""
+        master_password = False
+        for node in self.document.findall(nodes.Element):
+            tagname = node.tagname
+            if tagname == "meta" and node.get("name") == "master-password":
+                master_password = True
+            elif tagname == "exercise":
+                if has_ancestor(node, "exercise"):
+                    yield (node, "exercises cannot be nested")
+                solutions = list(node.findall(lambda n: n.tagname == "solution"))
+                for solution in solutions[1:]:
+                    yield (solution, "one exercise can only have one solution")
+            elif tagname == "solution":
+                if not has_ancestor(node, "exercise"):
+                    yield (node, "solutions must be nested in exercises")
+                if has_ancestor(node, "solution"):
+                    yield (node, "solutions cannot be nested")
+            elif tagname == "presenter_note":
+                if not master_password:
+                    yield (
+                        node,
+                        "presenter notes require a master password (the meta "
+                        "information master-password has to precede them)",
+                    )
+                if has_ancestor(node, "presenter_note"):
+                    yield (node, "presenter notes cannot be nested")
+            elif tagname == "card" and not has_ancestor(node, "deck"):
+                yield (node, "card directive must be nested in a deck directive")
@@ -0,0 +1,122 @@
+"""
+Build manifest which enables rst2ld to skip conversions whose inputs did
+not change.
+
+For each output file, the manifest records the files the conversion read
+(the source, all transitively included files and the referenced images)
+and a fingerprint. The fingerprint is the hash of:
+
+- the contents of all these files,
+- the effective settings (i.e., the command-line options and the values
+  from the configuration files such as "docutils.conf"; e.g., `ld_path`,
+  `theme` or `modules`), and
+- the sources of rst2ld itself.
+
+The manifest also records the files the conversion wrote in addition to the
+output file (e.g., the passwords file, the ".encrypted.json" sidecar, the
+lazily loaded topics and the assets). A document is only converted again
+if its fingerprint changed or if the output file or one of these files does
+not exist.
+"""
+
+import hashlib
+import json
+import os
+
+from lddocutils.publishing import new_publisher
+
+# Settings which are not relevant for the output (or which differ for
+# every conversion).
+ldIgnoredSettings = {
+    "record_dependencies",
+    "warning_stream",
+    "_source",
+    "_destination",
+}
+
+
+def hash_file(path):
+    try:
+        with open(path, "rb") as file:
+            return hashlib.file_digest(file, "sha256").hexdigest()
+    except OSError:
+        return "-"
+
+
+def settings_fingerprint(docutils_args):
+    """The fingerprint of the effective settings."""
+    return fingerprint_settings(new_publisher(docutils_args).settings)
+
+
+def fingerprint_settings(settings, ignored=frozenset()):
+    """The fingerprint of the given settings (and of rst2ld's sources);
+    the settings in `ignored` are not taken into account."""
+    settings = {
+        key: value
+        for key, value in vars(settings).items()
+        if key not in ldIgnoredSettings and key not in ignored
+    }
+    h = hashlib.sha256(json.dumps(settings, sort_keys=True, default=repr).encode())
+    h.update(code_fingerprint().encode())
+    return h.hexdigest()
+
+
+def code_fingerprint():
+    """The fingerprint of rst2ld's sources."""
+    h = hashlib.sha256()
+    package = os.path.dirname(os.path.abspath(__file__))
+    for dirpath, dirnames, filenames in sorted(os.walk(package)):
+        dirnames.sort()
+        for filename in sorted(filenames):
+            if filename.endswith(".py"):
+                h.update(filename.encode())
+                h.update(hash_file(os.path.join(dirpath, filename)).encode())
+    return h.hexdigest()
+
+
+class Manifest:
+    def __init__(self, path):
+        self.path = path
+        try:
+            with open(path) as file:
+                self.entries = json.load(file)
+        except (OSError, ValueError):
+            self.entries = {}
+
+    @staticmethod
+    def fingerprint(source, dependencies, settings_fingerprint):
+        h = hashlib.sha256(settings_fingerprint.encode())
+        for path in [source, *sorted(set(dependencies) - {source})]:
+            h.update(path.encode())
+            h.update(hash_file(path).encode())
+        return h.hexdigest()
+
+    def is_up_to_date(self, source, destination, settings_fingerprint):
+        entry = self.entries.get(destination)
+        if entry is None or not os.path.exists(destination):
+            return False
+        if not all(os.path.exists(path) for path in entry.get("outputs", [])):
+            return False
+        fingerprint = self.fingerprint(
+            source, entry["dependencies"], settings_fingerprint
+        )
+        return entry["fingerprint"] == fingerprint
+
+    def record(
+        self, source, destination, dependencies, settings_fingerprint, outputs=()
+    ):
+        """`outputs` are the files written in addition to the output file."""
+        self.entries[destination] = {
+            "fingerprint": self.fingerprint(
+                source, dependencies, settings_fingerprint
+            ),
+            "dependencies": list(dependencies),
+            "outputs": list(outputs),
+        }
+
+    def save(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(self.path, "w") as file:
+            json.dump(self.entries, file, indent=2)
@@ -0,0 +1,94 @@
+"""
+Helpers shared by rst2ld's front ends (batch, watch, serve and variants)
+and by the caches: the set-up of the publisher, the handling of the
+docutils options and the processing of a document in two steps (parsing
+and rendering the parsed doctree).
+"""
+
+import contextlib
+import copy
+
+from docutils import io
+from docutils.core import Publisher
+from docutils.readers import doctree
+
+from lddocutils.ldwriter import Writer
+
+
+def split_args(argv):
+    """Splits the arguments of a front end at "--"; returns the front end's
+    arguments and the docutils options."""
+    if "--" in argv:
+        return (argv[: argv.index("--")], argv[argv.index("--") + 1 :])
+    return (argv, [])
+
+
+def new_publisher(argv=None):
+    """A publisher which uses the LectureDoc2 writer; if `argv` is given,
+    the command line (docutils options, source and destination) is
+    processed."""
+    publisher = Publisher(writer=Writer())
+    publisher.set_components("standalone", "restructuredtext", None)
+    if argv is not None:
+        publisher.process_command_line(argv=argv)
+    return publisher
+
+
+def apply_parse_transforms(publisher, document):
+    """Applies the reader's and parser's transforms (but not the writer's
+    transforms)."""
+    document.transformer.populate_from_components(
+        (publisher.source, publisher.reader, publisher.reader.parser)
+    )
+    document.transformer.apply_transforms()
+
+
+def parse(publisher):
+    """Reads the document and applies the reader's and parser's transforms."""
+    publisher.set_io()
+    document = publisher.reader.read(
+        publisher.source, publisher.parser, publisher.settings
+    )
+    apply_parse_transforms(publisher, document)
+    return document
+
+
+@contextlib.contextmanager
+def detached(document):
+    """Temporarily removes the reporter, the transformer and the settings
+    from the document; they refer to streams and components which cannot
+    (and should not) be pickled or copied. They are recreated when the
+    doctree is rendered (see `renderer`)."""
+    (reporter, transformer, settings) = (
+        document.reporter,
+        document.transformer,
+        document.settings,
+    )
+    document.reporter = document.transformer = document.settings = None
+    try:
+        yield document
+    finally:
+        (document.reporter, document.transformer, document.settings) = (
+            reporter,
+            transformer,
+            settings,
+        )
+
+
+def copy_document(document):
+    """A deep copy of the (parsed) doctree."""
+    with detached(document):
+        return copy.deepcopy(document)
+
+
+def renderer(document, settings, destination, writer=None):
+    """A publisher which applies the writer's transforms to the parsed
+    doctree and writes it to the destination."""
+    publisher = Publisher(
+        reader=doctree.Reader(),
+        writer=writer or Writer(),
+        source=io.DocTreeInput(document),
+        settings=settings,
+    )
+    publisher.set_destination(destination_path=destination)
+    return publisher
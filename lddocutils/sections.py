@@ -0,0 +1,244 @@
+"""
+Section-granular parsing of LectureDoc2 documents.
+
+Each slide (i.e., each top-level section after the document title) is
+parsed on its own - together with the prelude (everything before the first
+slide: meta information, substitutions, roles, the title and the docinfo).
+The parsed slides - and the document-wide information (ids, names,
+references, footnotes, ...) they registered while being parsed - are then
+merged into the prelude's doctree. Hence, a slide only has to be parsed
+again when its text (or the prelude) changed; the transforms are applied
+to the merged doctree as usual.
+
+Documents are only parsed section by section if this results in the same
+doctree as parsing the whole document. This is not the case if:
+
+- a slide uses a directive which changes the parser's document-wide state
+  (e.g., `role`, `default-role`, `title`, `header` or `footer`),
+- the same name or id is used by two slides or by a slide and the prelude
+  (docutils would then generate other ids), or
+- the document's structure cannot be determined using its section titles.
+
+In these cases the document has to be parsed as a whole (`SectionConflict`).
+"""
+
+import collections
+import re
+
+from docutils import nodes
+
+# The characters which can be used to adorn section titles.
+ADORNMENT = re.compile(r"^([!-/:-@\[-`{-~])\1*\s*$")
+
+# Directives which (also) affect the parsing of the following slides.
+ldGlobalDirectives = re.compile(
+    r"^\s*\.\.\s+(role|default-role|title|header|footer)::", re.MULTILINE
+)
+
+# Explicit markup which refers to the next element (i.e., the next slide)
+# and which is therefore moved to the next slide.
+ldLeadingMarkup = re.compile(r"^\.\. (class:: .+|_[^:]+:)\s*$")
+
+
+class SectionConflict(Exception):
+    """The document has to be parsed as a whole."""
+
+
+def titles(lines):
+    """Yields the line index and the style of each section title."""
+    for i in range(len(lines) - 1):
+        title = lines[i]
+        adornment = ADORNMENT.match(lines[i + 1])
+        if (
+            not title.strip()
+            or title[0].isspace()
+            or ADORNMENT.match(title)
+            or adornment is None
+        ):
+            continue
+        if i > 0 and ADORNMENT.match(lines[i - 1]):
+            overline = lines[i - 1].rstrip()
+            underline = lines[i + 1].rstrip()
+            if overline == underline and (i == 1 or not lines[i - 2].strip()):
+                yield (i - 1, (adornment[1], True))
+        elif i == 0 or not lines[i - 1].strip():
+            yield (i, (adornment[1], False))
+
+
+def split(lines):
+    """Splits the document into the prelude and the slides.
+
+    Returns the indexes of the first line of each slide - the first slide
+    also ends the prelude - and whether the document has a title. The style
+    of the document title (if any) is only used once and it is used first;
+    the slides use the next style.
+    """
+    headings = list(titles(lines))
+    styles = [style for (_, style) in headings]
+    if not styles:
+        raise SectionConflict("no sections")
+    has_title = styles.count(styles[0]) == 1
+    slide_styles = styles[1:2] if has_title else styles[0:1]
+    if not slide_styles:
+        raise SectionConflict("no slides")
+    starts = [start for (start, style) in headings if style == slide_styles[0]]
+    for i, start in enumerate(starts):
+        # Move (content-less) class directives and targets - which are
+        # applied to the next element - to the slide.
+        while True:
+            previous = start - 1
+            while previous >= 0 and not lines[previous].strip():
+                previous -= 1
+            if (
+                previous < 0
+                or (previous > 0 and lines[previous - 1].strip())
+                or not ldLeadingMarkup.match(lines[previous])
+            ):
+                break
+            start = previous
+        starts[i] = start
+    for start, end in zip(starts, starts[1:] + [len(lines)]):
+        if ldGlobalDirectives.search("\n".join(lines[start:end])):
+            raise SectionConflict("a slide uses a document-wide directive")
+    return (starts, has_title)
+
+
+def slides_parent(document, has_title):
+    """The node which contains the slides: the section of the document
+    title (if any) or the document."""
+    if not has_title:
+        return document
+    if not document.children or not isinstance(document[-1], nodes.section):
+        raise SectionConflict("no title section")
+    return document[-1]
+
+
+class Fragment:
+    """A parsed slide and the document-wide information it registered."""
+
+    REGISTRIES = [
+        "indirect_targets",
+        "autofootnotes",
+        "autofootnote_refs",
+        "symbol_footnotes",
+        "symbol_footnote_refs",
+        "footnotes",
+        "citations",
+    ]
+    MULTI_REGISTRIES = ["refnames", "refids", "footnote_refs", "citation_refs"]
+
+    def __init__(self, document, slide_nodes, seed, prelude_id_counter, prelude_end):
+        """Extracts the nodes of the slide - and everything they registered
+        - from the (chunk's) document which also contains the prelude."""
+        members = {id(node) for top in slide_nodes for node in top.findall()}
+        elements = [
+            node for top in slide_nodes for node in top.findall(nodes.Element)
+        ]
+
+        self.nodes = slide_nodes
+        self.ids = {k: v for (k, v) in document.ids.items() if id(v) in members}
+        names = {
+            name for node in elements for name in node["names"] + node["dupnames"]
+        }
+        self.nameids = {
+            n: document.nameids[n] for n in names if n in document.nameids
+        }
+        self.nametypes = {
+            n: document.nametypes[n] for n in names if n in document.nametypes
+        }
+        self.registries = {
+            name: [n for n in getattr(document, name) if id(n) in members]
+            for name in self.REGISTRIES
+        }
+        self.multi_registries = {
+            name: {
+                key: [n for n in values if id(n) in members]
+                for (key, values) in getattr(document, name).items()
+                if any(id(n) in members for n in values)
+            }
+            for name in self.MULTI_REGISTRIES
+        }
+        self.substitution_defs = {
+            k: v for (k, v) in document.substitution_defs.items() if id(v) in members
+        }
+        self.substitution_names = {
+            k: v
+            for (k, v) in document.substitution_names.items()
+            if v in self.substitution_defs
+        }
+        self.pending = [
+            (int(priority[:3]), pending)
+            for (priority, _, pending, _) in document.transformer.transforms
+            if id(pending) in members
+        ]
+        self.parse_messages = [
+            message
+            for message in document.parse_messages
+            if (message.get("line") or prelude_end + 1) > prelude_end
+        ]
+        self.id_counter = document.id_counter - seed - prelude_id_counter
+        self.max_level = document.reporter.max_level
+        self.dependencies = []
+        # The index of the slide's first line and the messages which were
+        # reported while the slide was parsed (set by the parser).
+        self.start = None
+        self.reported = []
+
+        # The nodes must not refer to the chunk's document (e.g., when they
+        # are pickled); they will be attached to the merged document.
+        for top in slide_nodes:
+            top.parent = None
+            for node in top.findall():
+                node._document = None
+
+    def move_to(self, start, source):
+        """Adjusts the line numbers of the nodes and messages of the slide
+        (which stem from `source`) if the slide now starts at `start`."""
+        delta = start - self.start
+        if delta == 0:
+            return
+        messages = [m for m in self.parse_messages if m.parent is None]
+        for top in [*self.nodes, *messages, *self.reported]:
+            for node in top.findall(nodes.Element):
+                if node.source not in (None, source):
+                    continue  # e.g., an included file
+                if node.line is not None:
+                    node.line += delta
+                if isinstance(node, nodes.system_message) and node.get("line"):
+                    node["line"] += delta
+        self.start = start
+
+    def merge_into(self, document, parent):
+        """Adds the slide to the document (`parent` contains the slides)."""
+        for key in self.ids:
+            if key in document.ids:
+                raise SectionConflict(f'duplicate id: "{key}"')
+        for name in self.nameids.keys() | self.nametypes.keys():
+            if name in document.nameids or name in document.nametypes:
+                raise SectionConflict(f'duplicate name: "{name}"')
+        for name in self.substitution_names:
+            if name in document.substitution_names:
+                raise SectionConflict(f'duplicate substitution: "{name}"')
+
+        parent.extend(self.nodes)
+        document.ids.update(self.ids)
+        document.nameids.update(self.nameids)
+        document.nametypes.update(self.nametypes)
+        for name, values in self.registries.items():
+            getattr(document, name).extend(values)
+        for name, registry in self.multi_registries.items():
+            for key, values in registry.items():
+                getattr(document, name).setdefault(key, []).extend(values)
+        document.substitution_defs.update(self.substitution_defs)
+        document.substitution_names.update(self.substitution_names)
+        for priority, pending in self.pending:
+            document.transformer.add_pending(pending, priority)
+        document.parse_messages.extend(self.parse_messages)
+        document.id_counter.update(self.id_counter)
+        document.reporter.max_level = max(document.reporter.max_level, self.max_level)
+
+
+def seed(document, prelude_id_counter):
+    """The initial id counter of the next slide's chunk; the chunk's prelude
+    will (again) add the counts of the prelude."""
+    return collections.Counter(document.id_counter - prelude_id_counter)
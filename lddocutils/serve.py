@@ -0,0 +1,204 @@
+"""
+Rendering service for editors and preview tools: a long-running process
+which converts documents in a pool of (warm) worker processes; i.e., a
+conversion does not pay the start-up costs of rst2ld.
+
+    rst2ld.py --serve [--port N | --socket PATH] [--jobs N] [-- <docutils options>]
+
+The service speaks (minimal) HTTP/1.1 on localhost or on a Unix socket.
+A document is rendered by posting a JSON object to `/render` which either
+contains the document (`{"source": "<reStructuredText>"}`; the optional
+`"path"` is used to resolve relative includes and images) or only the
+path of the document (`{"path": "<file>"}`). The response is a JSON object
+with the parts `html_head`, `html_body` and `passwords` and the messages
+(warnings, errors) which were reported while converting the document.
+E.g.:
+
+    curl --unix-socket ld.sock -d '{"path": "slides.rst"}' http://ld/render
+
+The docutils options (e.g., "--ld-path") are used for all documents.
+
+Requests via TCP are only accepted if their Host header names localhost,
+the loopback address or the given host (and the port of the service); this
+prevents web pages from accessing the service using DNS rebinding (the
+service reads local files on behalf of its clients).
+"""
+
+import argparse
+import asyncio
+import copy
+import io
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from http import HTTPStatus
+
+from docutils import utils
+from docutils.core import publish_parts
+
+from lddocutils.ldwriter import Writer
+from lddocutils.publishing import new_publisher, split_args
+
+# The settings of the worker process; see init_worker.
+ldSettings = None
+
+
+def init_worker(docutils_args):
+    """Computes the settings once per worker (this also imports docutils,
+    the LectureDoc2 writer and registers the directives)."""
+    global ldSettings
+    ldSettings = new_publisher(docutils_args).settings
+
+
+def render(request):
+    """Renders the requested document; returns the HTTP status and the
+    response."""
+    path = request.get("path")
+    source = request.get("source")
+    if source is None:
+        if path is None:
+            return (HTTPStatus.BAD_REQUEST, {"error": '"source" or "path" required'})
+        try:
+            with open(path, encoding="utf-8-sig") as file:
+                source = file.read()
+        except OSError as error:
+            return (HTTPStatus.NOT_FOUND, {"error": str(error)})
+
+    settings = copy.copy(ldSettings)
+    settings.record_dependencies = utils.DependencyList()
+    messages = io.StringIO()
+    settings.warning_stream = messages
+    # Errors are reported to the client; the service must not exit.
+    settings.traceback = True
+    try:
+        parts = publish_parts(
+            source=source, source_path=path, writer=Writer(), settings=settings
+        )
+    except Exception as error:
+        return (
+            HTTPStatus.UNPROCESSABLE_ENTITY,
+            {"error": repr(error), "messages": messages.getvalue()},
+        )
+    return (
+        HTTPStatus.OK,
+        {
+            "html_head": parts["html_head"],
+            "html_body": parts["html_body"],
+            "passwords": parts["passwords"],
+            "messages": messages.getvalue(),
+        },
+    )
+
+
+class Server:
+    def __init__(self, docutils_args, jobs):
+        self.executor = ProcessPoolExecutor(
+            jobs, initializer=init_worker, initargs=(docutils_args,)
+        )
+        # The accepted values of the Host header; None if the service
+        # listens on a Unix socket.
+        self.allowed_hosts = None
+
+    async def handle(self, reader, writer):
+        try:
+            (status, response) = await self.respond(reader)
+        except (ValueError, asyncio.IncompleteReadError) as error:
+            (status, response) = (HTTPStatus.BAD_REQUEST, {"error": str(error)})
+        body = json.dumps(response, ensure_ascii=False).encode("utf-8")
+        writer.write(
+            (
+                f"HTTP/1.1 {status.value} {status.phrase}\r\n"
+                "Content-Type: application/json; charset=utf-8\r\n"
+                f"Content-Length: {len(body)}\r\n"
+                "Connection: close\r\n"
+                "\r\n"
+            ).encode("latin-1")
+            + body
+        )
+        try:
+            await writer.drain()
+        finally:
+            writer.close()
+
+    async def respond(self, reader):
+        request_line = (await reader.readline()).decode("latin-1")
+        (method, target, _) = request_line.split(" ", 2)
+        content_length = 0
+        host = None
+        while (line := (await reader.readline()).decode("latin-1").strip()) != "":
+            (name, value) = line.split(":", 1)
+            if name.strip().lower() == "content-length":
+                content_length = int(value)
+            elif name.strip().lower() == "host":
+                host = value.strip().lower()
+        body = await reader.readexactly(content_length)
+
+        if self.allowed_hosts is not None and host not in self.allowed_hosts:
+            return (HTTPStatus.FORBIDDEN, {"error": f"host not allowed: {host}"})
+        if target != "/render":
+            return (HTTPStatus.NOT_FOUND, {"error": f"unknown resource: {target}"})
+        if method != "POST":
+            return (HTTPStatus.METHOD_NOT_ALLOWED, {"error": "POST required"})
+        request = json.loads(body)
+        if not isinstance(request, dict):
+            raise ValueError("JSON object required")
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, render, request)
+
+    async def serve(self, host, port, socket_path):
+        if socket_path is not None:
+            server = await asyncio.start_unix_server(self.handle, socket_path)
+        else:
+            server = await asyncio.start_server(self.handle, host, port)
+            port = server.sockets[0].getsockname()[1]
+            self.allowed_hosts = {
+                f"{name}:{port}"
+                for name in ("localhost", "127.0.0.1", "[::1]", host.lower())
+            }
+        addresses = ", ".join(str(s.getsockname()) for s in server.sockets)
+        print(f"Serving on {addresses}; press Ctrl+C to stop.", flush=True)
+        async with server:
+            await server.serve_forever()
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(
+        prog="rst2ld.py --serve",
+        description="Renders reStructuredText documents to LectureDoc2 on request.",
+    )
+    parser.add_argument(
+        "--host",
+        default="127.0.0.1",
+        help='the host to listen on (default: "127.0.0.1")',
+    )
+    parser.add_argument(
+        "--port",
+        type=int,
+        default=8047,
+        help="the port to listen on (default: 8047)",
+    )
+    parser.add_argument(
+        "--socket",
+        metavar="PATH",
+        help="the Unix socket to listen on (instead of host and port)",
+    )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=os.cpu_count(),
+        metavar="N",
+        help="the number of worker processes (default: number of cores)",
+    )
+    (argv, docutils_args) = split_args(argv)
+    args = parser.parse_args(argv)
+
+    server = Server(docutils_args, args.jobs)
+    try:
+        asyncio.run(server.serve(args.host, args.port, args.socket))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.executor.shutdown(cancel_futures=True)
+        if args.socket is not None and os.path.exists(args.socket):
+            os.remove(args.socket)
+    return 0
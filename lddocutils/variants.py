@@ -0,0 +1,85 @@
+"""
+Generates several variants of a document (see `--ld-variant`) - e.g., the
+slides, an exercise sheet and the solutions - in one invocation.
+
+    rst2ld.py --variants <source> [--slides FILE] [--exercise-sheet FILE]
+              [--solutions FILE] [--presenter-notes FILE] [-- <docutils options>]
+
+The document is parsed - and the reader's and parser's transforms are
+applied - only once; each variant is then rendered using a copy of the
+doctree (i.e., only the writer's transforms and the translator are run per
+variant). The docutils options (e.g., "--ld-path") are used for all
+variants; the depfile (`--ld-depfile`) is only written for the first
+variant because all variants depend on the same files.
+"""
+
+import argparse
+import copy
+
+from docutils import utils
+
+from lddocutils.ldwriter.transforms import ldVariants
+from lddocutils.publishing import (
+    copy_document,
+    new_publisher,
+    parse,
+    renderer,
+    split_args,
+)
+
+
+def publish(source, destinations, docutils_args):
+    """Renders the variants of the document; `destinations` maps the
+    variants to the output files. Returns the exit status."""
+    publisher = new_publisher([*docutils_args, source])
+    try:
+        document = parse(publisher)
+    except utils.SystemMessage as error:
+        publisher.report_SystemMessage(error)
+        return 1
+    exit_status = 0
+    if document.reporter.max_level >= publisher.settings.exit_status_level:
+        exit_status = document.reporter.max_level + 10
+
+    for i, (variant, destination) in enumerate(destinations.items()):
+        settings = copy.copy(publisher.settings)
+        settings.ld_variant = variant
+        settings._destination = destination
+        if i > 0:
+            settings.ld_depfile = None
+        variant_publisher = renderer(copy_document(document), settings, destination)
+        try:
+            variant_publisher.publish()
+        except SystemExit as exit:
+            code = exit.code if isinstance(exit.code, int) else 1
+            exit_status = max(exit_status, code)
+            continue
+        max_level = variant_publisher.document.reporter.max_level
+        if max_level >= settings.exit_status_level:
+            exit_status = max(exit_status, max_level + 10)
+    return exit_status
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(
+        prog="rst2ld.py --variants",
+        description="Generates several variants of a reStructuredText document.",
+    )
+    parser.add_argument("source", metavar="SOURCE", help="the document")
+    for variant in ldVariants:
+        parser.add_argument(
+            "--" + variant,
+            metavar="FILE",
+            help=f'the output file of the variant "{variant}"',
+        )
+    (argv, docutils_args) = split_args(argv)
+    args = parser.parse_args(argv)
+
+    destinations = {
+        variant: getattr(args, variant.replace("-", "_"))
+        for variant in ldVariants
+        if getattr(args, variant.replace("-", "_")) is not None
+    }
+    if not destinations:
+        parser.error("at least one variant has to be specified")
+    return publish(args.source, destinations, docutils_args)
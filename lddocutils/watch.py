@@ -0,0 +1,130 @@
+"""
+Watches a directory and rebuilds the documents whose sources - or the
+files they depend on (e.g., included files) - changed. The documents are
+converted in this (warm) interpreter; i.e., docutils, the LectureDoc2
+writer and all directives are only loaded once.
+
+    rst2ld.py --watch [--interval S] [--debounce S] <dir> [-- <docutils options>]
+
+The file system is polled (only the modification times of the relevant
+files are checked); changes are debounced to avoid rebuilding a document
+while an editor is still writing files.
+
+If a doctree cache is specified (`--doctree-cache <directory>`), only the
+slides which changed are parsed again (see `lddocutils.doctree_cache`).
+"""
+
+import argparse
+import os
+import time
+
+from lddocutils.batch import convert, find_sources
+from lddocutils.publishing import split_args
+
+
+def mtime(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
+class Watcher:
+    def __init__(self, directory, docutils_args, suffix=".html", doctree_cache=None):
+        self.directory = directory
+        self.docutils_args = docutils_args
+        self.suffix = suffix
+        self.doctree_cache = doctree_cache
+        # Maps a document to the modification times of the files (including
+        # the document itself) it depended on when it was converted last.
+        self.snapshots = {}
+
+    def snapshot(self, source, dependencies):
+        files = [source, *dependencies]
+        return {path: mtime(path) for path in files}
+
+    def outdated_documents(self):
+        outdated = []
+        for source in find_sources([self.directory]):
+            snapshot = self.snapshots.get(source)
+            if snapshot is None or any(
+                mtime(path) != recorded for path, recorded in snapshot.items()
+            ):
+                outdated.append(source)
+        return outdated
+
+    def build(self, source):
+        start = time.perf_counter()
+        (status, messages, dependencies, _) = convert(
+            source, source + self.suffix, self.docutils_args, self.doctree_cache
+        )
+        duration = time.perf_counter() - start
+        if status != 0:
+            # The files the document depends on are not known if the
+            # conversion failed (e.g., because of an error in an included
+            # file); the files it depended on before are still watched.
+            previous = self.snapshots.get(source, {})
+            dependencies = [*dependencies, *previous.keys() - {source}]
+        # The snapshot is also taken when the conversion failed; the document
+        # is rebuilt when it (or one of the files it depends on) changes.
+        self.snapshots[source] = self.snapshot(source, dependencies)
+        state = "OK" if status == 0 else "FAILED"
+        print(f"[{state}] {source} ({duration:.2f}s)", flush=True)
+        if messages:
+            print(messages, end="", flush=True)
+
+    def run(self, interval, debounce):
+        print(f"Watching {self.directory} (press Ctrl+C to stop).", flush=True)
+        while True:
+            outdated = self.outdated_documents()
+            if outdated:
+                # Wait until the files are no longer modified.
+                time.sleep(debounce)
+                while (still_outdated := self.outdated_documents()) != outdated:
+                    outdated = still_outdated
+                    time.sleep(debounce)
+                for source in outdated:
+                    self.build(source)
+            time.sleep(interval)
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(
+        prog="rst2ld.py --watch",
+        description="Rebuilds LectureDoc2 documents when their sources change.",
+    )
+    parser.add_argument("directory", metavar="DIR", help="the directory to watch")
+    parser.add_argument(
+        "--interval",
+        type=float,
+        default=0.5,
+        metavar="S",
+        help="the polling interval in seconds (default: 0.5)",
+    )
+    parser.add_argument(
+        "--debounce",
+        type=float,
+        default=0.2,
+        metavar="S",
+        help="the time (in seconds) files have to be unchanged before a "
+        "document is rebuilt (default: 0.2)",
+    )
+    parser.add_argument(
+        "--suffix",
+        default=".html",
+        help='the suffix appended to the name of the output file (default: ".html")',
+    )
+    parser.add_argument(
+        "--doctree-cache",
+        metavar="DIR",
+        help="the directory of the cache of the parsed documents and slides",
+    )
+    (argv, docutils_args) = split_args(argv)
+    args = parser.parse_args(argv)
+
+    watcher = Watcher(args.directory, docutils_args, args.suffix, args.doctree_cache)
+    try:
+        watcher.run(args.interval, args.debounce)
+    except KeyboardInterrupt:
+        pass
+    return 0
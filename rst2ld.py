@@ -7,10 +7,31 @@
 A minimal front end to the Docutils Publisher, producing HTML documents for LectureDoc2.
 """
 
+import sys
+
 from docutils.core import publish_cmdline, default_description
 from lddocutils.ldwriter import Writer
 
 DESCRIPTION = ('Generates LectureDoc2 HTML documents from standalone '
                'reStructuredText sources.  ' + default_description)
 
-publish_cmdline(writer=Writer(), writer_name='html', description=DESCRIPTION)
+if __name__ == '__main__':
+    # The guard is required by the worker processes (see --ld-jobs).
+    if len(sys.argv) > 1 and sys.argv[1] == '--batch':
+        # rst2ld.py --batch [--jobs N] <files or dirs> [-- <docutils options>]
+        from lddocutils.batch import main
+        sys.exit(main(sys.argv[2:]))
+    if len(sys.argv) > 1 and sys.argv[1] == '--watch':
+        # rst2ld.py --watch <dir> [-- <docutils options>]
+        from lddocutils.watch import main
+        sys.exit(main(sys.argv[2:]))
+    if len(sys.argv) > 1 and sys.argv[1] == '--serve':
+        # rst2ld.py --serve [--port N | --socket PATH] [-- <docutils options>]
+        from lddocutils.serve import main
+        sys.exit(main(sys.argv[2:]))
+    if len(sys.argv) > 1 and sys.argv[1] == '--variants':
+        # rst2ld.py --variants <file> [--slides FILE] [--solutions FILE] ...
+        from lddocutils.variants import main
+        sys.exit(main(sys.argv[2:]))
+
+    publish_cmdline(writer=Writer(), writer_name='html', description=DESCRIPTION)
@@ -0,0 +1,105 @@
+"""
+Tests of the slide-granular doctree cache (see `lddocutils.doctree_cache`):
+a document which is parsed using cached slides has to be rendered exactly
+like a document which is parsed as a whole.
+"""
+
+import pytest
+
+from lddocutils import batch, sections
+from lddocutils.doctree_cache import DoctreeCache
+
+DECK = """\
+Deck
+====
+
+Intro
+-----
+
+See `Details`_ and the note [#]_.
+
+.. [#] The first footnote.
+
+Details
+-------
+
+.. _target:
+
+Text with a footnote [#]_ and a link to target_.
+
+.. [#] The second footnote.
+
+Summary
+-------
+
+Back to the `Intro`_.
+
+.. include:: snippet.txt
+"""
+
+
+def write(path, text):
+    path.write_text(text, encoding="utf-8")
+    return str(path)
+
+
+@pytest.fixture(autouse=True)
+def no_fallback(monkeypatch):
+    """Fails if a document is parsed as a whole instead of slide by slide."""
+    parse_slides = DoctreeCache.parse_slides
+
+    def checked(*args):
+        try:
+            return parse_slides(*args)
+        except sections.SectionConflict as conflict:
+            pytest.fail(f"the document was parsed as a whole: {conflict}")
+
+    monkeypatch.setattr(DoctreeCache, "parse_slides", checked)
+
+
+def full_parse(source, destination):
+    batch.publish(source, destination, [])
+    with open(destination, encoding="utf-8") as file:
+        return file.read()
+
+
+def cached_parse(cache, source, destination):
+    cache.publish(source, destination, [])
+    with open(destination, encoding="utf-8") as file:
+        return file.read()
+
+
+def test_cached_slides_match_full_parse(tmp_path, monkeypatch):
+    write(tmp_path / "snippet.txt", "Included text.\n")
+    source = write(tmp_path / "deck.rst", DECK)
+    cache = DoctreeCache(str(tmp_path / "cache"))
+    cached_parse(cache, source, str(tmp_path / "cached.html"))
+
+    # Moves the following slides; only the changed slide is parsed again.
+    write(tmp_path / "deck.rst", DECK.replace("[#]_.\n", "[#]_.\n\nA new line.\n"))
+    parsed_slides = []
+    store_slide = DoctreeCache.store_slide
+
+    def recording_store_slide(self, key, fragment):
+        parsed_slides.append(key)
+        store_slide(self, key, fragment)
+
+    monkeypatch.setattr(DoctreeCache, "store_slide", recording_store_slide)
+    cached = cached_parse(cache, source, str(tmp_path / "cached.html"))
+    assert len(parsed_slides) == 1
+    assert "A new line." in cached
+    assert cached == full_parse(source, str(tmp_path / "full.html"))
+
+
+def test_slides_are_not_shared_between_sources(tmp_path):
+    cache = DoctreeCache(str(tmp_path / "cache"))
+    outputs = {}
+    for name in ["a", "b"]:
+        directory = tmp_path / name
+        directory.mkdir()
+        write(directory / "snippet.txt", f"Content of {name}.\n")
+        source = write(directory / "deck.rst", DECK)
+        outputs[name] = cached_parse(cache, source, str(directory / "deck.html"))
+    assert "Content of a." in outputs["a"]
+    assert "Content of b." in outputs["b"]
+    assert "Content of a." not in outputs["b"]